@@ -1,30 +1,63 @@
 """API routes for document processing and retrieval."""
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, HTTPException, BackgroundTasks
+from typing import List, Optional, Tuple
+from datetime import datetime
 from uuid import UUID
+import asyncio
+import base64
+import contextvars
+import functools
 import logging
-import tempfile
-import os
-from pathlib import Path
 
-from app.db.connection import get_db
+from app.config import BATCH_CONCURRENCY
 from app.models.schemas import (
     ProcessDocumentRequest,
     DocumentResponse,
+    DocumentPage,
     InstructionResponse,
     SearchRequest,
     SearchResult,
-    DocumentWithInstructions
+    DocumentWithInstructions,
+    JobResponse,
+    JobSubmittedResponse
 )
 from app.services.drive_service import drive_service
-from app.services.pdf_service import pdf_service
 from app.services.alloydb_service import alloydb_service
+from app.workers.tasks import ingest_document, ingest_executor, process_document_task
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+def _encode_cursor(document: DocumentResponse) -> str:
+    """
+    Build the keyset cursor pointing after the given document.
+    
+    The cursor is base64url-encoded, so it can be pasted into a query string as-is
+    (the "+" of the timestamp's UTC offset would otherwise decode to a space).
+    """
+    raw = f"{document.created_at.isoformat()},{document.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """Parse a cursor produced by _encode_cursor; raises ValueError if malformed."""
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    created_at, doc_id = raw.rsplit(",", 1)
+    return datetime.fromisoformat(created_at), UUID(doc_id)
+
+
+async def _run_ingest(file_id: str, filename: str) -> UUID:
+    """
+    Run ingest_document on the dedicated ingest threads.
+    
+    Ingests block for minutes, so they must not occupy the default executor that serves
+    read routes and /health. Unlike asyncio.to_thread, run_in_executor doesn't copy the
+    context (request ID) itself.
+    """
+    ingest = functools.partial(contextvars.copy_context().run, ingest_document, file_id, filename)
+    return await asyncio.get_running_loop().run_in_executor(ingest_executor, ingest)
+
 
 @router.post("/documents/process", response_model=DocumentResponse, status_code=201)
 async def process_document(
@@ -40,13 +73,13 @@ async def process_document(
         # Determine file to process
         if request.filename:
             # If filename is provided, check database first to avoid unnecessary Drive API calls
-            existing_doc = alloydb_service.get_document_by_filename(request.filename)
+            existing_doc = await asyncio.to_thread(alloydb_service.get_document_by_filename, request.filename)
             if existing_doc:
-                logger.info(f"Document {request.filename} already exists, returning existing document")
-                return DocumentResponse.model_validate(existing_doc)
+                logger.info("Document %s already exists, returning existing document", request.filename)
+                return DocumentResponse.model_construct(**existing_doc)
             
             # Document doesn't exist, get file info from Drive
-            file_info = drive_service.get_file_by_name(request.filename)
+            file_info = await asyncio.to_thread(drive_service.get_file_by_name, request.filename)
             if not file_info:
                 raise HTTPException(status_code=404, detail=f"File '{request.filename}' not found in Google Drive")
             filename = file_info['name']
@@ -54,63 +87,88 @@ async def process_document(
         elif request.file_id:
             # Get file info by file ID (need to call Drive API to get filename)
             try:
-                file_info = drive_service.get_file_info(request.file_id)
+                file_info = await asyncio.to_thread(drive_service.get_file_info, request.file_id)
                 filename = file_info.get('name')
                 file_id = request.file_id
             except Exception as e:
-                logger.error(f"Error getting file info for file_id {request.file_id}: {str(e)}")
+                logger.error("Error getting file info for file_id %s: %s", request.file_id, e)
                 raise HTTPException(status_code=404, detail=f"File with ID '{request.file_id}' not found in Google Drive")
             
             # Check if document already exists
-            existing_doc = alloydb_service.get_document_by_filename(filename)
+            existing_doc = await asyncio.to_thread(alloydb_service.get_document_by_filename, filename)
             if existing_doc:
-                logger.info(f"Document {filename} already exists, returning existing document")
-                return DocumentResponse.model_validate(existing_doc)
+                logger.info("Document %s already exists, returning existing document", filename)
+                return DocumentResponse.model_construct(**existing_doc)
         else:
             raise HTTPException(status_code=400, detail="Either file_id or filename must be provided")
         
-        # Download PDF from Google Drive
-        logger.info(f"Downloading PDF {filename} from Google Drive")
-        pdf_path = drive_service.download_file(file_id)
+        # Download, extract and store on the ingest threads so the event loop stays free
+        doc_id = await _run_ingest(file_id, filename)
         
-        try:
-            # Upload PDF to Gemini and extract structured data
-            logger.info(f"Extracting structured data from {filename}")
-            images, gemini_file = pdf_service.get_tutorial_images(pdf_path)
-            instructions_data = pdf_service.extract_structured_tutorial(gemini_file)
-            
-            # Store in AlloyDB using SQL functions
-            logger.info(f"Storing {filename} in AlloyDB")
-            doc_id = alloydb_service.store_document_with_instructions(
-                filename=filename,
-                instructions_data=instructions_data
-            )
-            
-            # Get the stored document
-            document = alloydb_service.get_document(doc_id)
-            if not document:
-                raise HTTPException(status_code=500, detail="Failed to retrieve stored document")
-            
-            return DocumentResponse.model_validate(document)
-            
-        finally:
-            # Clean up temporary file
-            try:
-                pdf_file = Path(pdf_path)
-                if pdf_file.exists():
-                    pdf_file.unlink(missing_ok=True)
-                    logger.debug(f"Cleaned up temporary file {pdf_path}")
-            except OSError as e:
-                # Handle OS errors (permissions, file in use, etc.)
-                logger.warning(f"Could not remove temporary file {pdf_path}: {e}")
+        # Get the stored document
+        document = await asyncio.to_thread(alloydb_service.get_document, doc_id)
+        if not document:
+            raise HTTPException(status_code=500, detail="Failed to retrieve stored document")
+        
+        return DocumentResponse.model_construct(**document)
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error processing document: {str(e)}", exc_info=True)
+        logger.error("Error processing document: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
 
 
+@router.post("/documents/jobs", response_model=JobSubmittedResponse, status_code=202)
+async def submit_document_job(
+    request: ProcessDocumentRequest,
+    background_tasks: BackgroundTasks
+):
+    """
+    Queue a PDF document from Google Drive for background processing.
+    
+    Returns immediately with a job ID; poll /api/jobs/{job_id} for the result.
+    """
+    if not request.file_id and not request.filename:
+        raise HTTPException(status_code=400, detail="Either file_id or filename must be provided")
+    
+    try:
+        job_id = await asyncio.to_thread(
+            alloydb_service.create_job,
+            file_id=request.file_id,
+            filename=request.filename
+        )
+        background_tasks.add_task(
+            process_document_task,
+            job_id,
+            file_id=request.file_id,
+            filename=request.filename
+        )
+        return JobSubmittedResponse(
+            job_id=job_id,
+            status="pending",
+            status_url=f"/api/jobs/{job_id}"
+        )
+    except Exception as e:
+        logger.error("Error submitting document job: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error submitting document job: {str(e)}")
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: UUID):
+    """Get the status of a background processing job."""
+    try:
+        job = await asyncio.to_thread(alloydb_service.get_job, job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        return JobResponse.model_construct(**job)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error getting job: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error getting job: {str(e)}")
+
+
 @router.post("/documents/batch-process", status_code=202)
 async def batch_process_documents(
     file_ids: List[str] = None,
@@ -119,17 +177,21 @@ async def batch_process_documents(
     """
     Process multiple PDF documents from Google Drive.
     
+    Documents are processed concurrently, at most BATCH_CONCURRENCY at a time.
     Returns a list of document IDs that will be processed.
     """
     try:
         if file_ids:
+            # Resolve all names with batched metadata requests; unresolved files keep
+            # name None and go through process_document, which reports the error
+            files_info = await asyncio.to_thread(drive_service.get_files_info, file_ids)
             files_to_process = [
-                {'id': fid, 'name': None} for fid in file_ids
+                {'id': fid, 'name': files_info.get(fid, {}).get('name')} for fid in file_ids
             ]
         elif filenames:
             files_to_process = []
             for filename in filenames:
-                file_info = drive_service.get_file_by_name(filename)
+                file_info = await asyncio.to_thread(drive_service.get_file_by_name, filename)
                 if file_info:
                     files_to_process.append({
                         'id': file_info['id'],
@@ -137,25 +199,47 @@ async def batch_process_documents(
                     })
         else:
             # Process all PDFs in the folder
-            pdf_files = drive_service.list_pdf_files()
+            pdf_files = await asyncio.to_thread(drive_service.list_pdf_files)
             files_to_process = [
                 {'id': f['id'], 'name': f['name']} for f in pdf_files
             ]
         
-        processed_ids = []
+        # Drop repeated files, which would otherwise be ingested concurrently and pay twice for Gemini
+        files_to_process = list({f['id']: f for f in files_to_process}.values())
+        
+        # Look up already stored documents with one query instead of one per file
+        known_names = [f['name'] for f in files_to_process if f['name']]
+        existing = await asyncio.to_thread(alloydb_service.get_existing_documents, known_names)
+        
+        processed_ids = [str(existing[f['name']]) for f in files_to_process if f['name'] in existing]
+        pending = [f for f in files_to_process if f['name'] not in existing]
         errors = []
         
-        for file_info in files_to_process:
-            try:
+        semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+        
+        async def _process_one(file_info):
+            async with semaphore:
+                if file_info['name']:
+                    # Existence was already checked above, go straight to ingestion
+                    return await _run_ingest(file_info['id'], file_info['name'])
                 request = ProcessDocumentRequest(file_id=file_info['id'])
                 result = await process_document(request, BackgroundTasks())
-                processed_ids.append(str(result.id))
-            except Exception as e:
+                return result.id
+        
+        results = await asyncio.gather(
+            *[_process_one(file_info) for file_info in pending],
+            return_exceptions=True
+        )
+        
+        for file_info, result in zip(pending, results):
+            if isinstance(result, Exception):
                 errors.append({
                     'file_id': file_info['id'],
                     'filename': file_info['name'],
-                    'error': str(e)
+                    'error': str(result)
                 })
+            else:
+                processed_ids.append(str(result))
         
         return {
             'processed': len(processed_ids),
@@ -164,64 +248,84 @@ async def batch_process_documents(
         }
     
     except Exception as e:
-        logger.error(f"Error in batch processing: {str(e)}", exc_info=True)
+        logger.error("Error in batch processing: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error in batch processing: {str(e)}")
 
 
-@router.get("/documents", response_model=List[DocumentResponse])
+@router.get("/documents", response_model=DocumentPage)
 async def list_documents(
     limit: int = 100,
     offset: int = 0,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None
 ):
-    """List all processed documents."""
+    """
+    List processed documents, newest first.
+    
+    Pass the returned next_cursor as ``cursor`` to fetch the following page.
+    """
     try:
-        documents = alloydb_service.list_documents(limit=limit, offset=offset)
-        return [DocumentResponse.model_validate(doc) for doc in documents]
+        keyset = _decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+    
+    try:
+        documents = await asyncio.to_thread(
+            alloydb_service.list_documents, limit=limit, offset=offset, cursor=keyset
+        )
+        # Rows come typed from the driver; model_construct skips revalidating trusted data
+        items = [DocumentResponse.model_construct(**row) for row in documents]
+        next_cursor = _encode_cursor(items[-1]) if items and len(items) == limit else None
+        return DocumentPage.model_construct(items=items, next_cursor=next_cursor)
     except Exception as e:
-        logger.error(f"Error listing documents: {str(e)}", exc_info=True)
+        logger.error("Error listing documents: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error listing documents: {str(e)}")
 
 
+def _load_document_with_instructions(doc_id: UUID):
+    """Read a document and its instructions in one thread hop, sharing one database session."""
+    with alloydb_service.session() as db:
+        document = alloydb_service.get_document(doc_id, db=db)
+        if not document:
+            return None, []
+        return document, alloydb_service.get_document_instructions(doc_id, db=db)
+
+
 @router.get("/documents/{doc_id}", response_model=DocumentWithInstructions)
 async def get_document(
-    doc_id: UUID,
-    db: Session = Depends(get_db)
+    doc_id: UUID
 ):
     """Get a document with all its instructions."""
     try:
-        document = alloydb_service.get_document(doc_id)
+        document, instructions = await asyncio.to_thread(_load_document_with_instructions, doc_id)
         if not document:
             raise HTTPException(status_code=404, detail=f"Document {doc_id} not found")
         
-        instructions = alloydb_service.get_document_instructions(doc_id)
-        
-        return DocumentWithInstructions(
-            document=DocumentResponse.model_validate(document),
-            instructions=[InstructionResponse.model_validate(instr) for instr in instructions]
+        return DocumentWithInstructions.model_construct(
+            document=DocumentResponse.model_construct(**document),
+            instructions=[InstructionResponse.model_construct(**instr) for instr in instructions]
         )
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error getting document: {str(e)}", exc_info=True)
+        logger.error("Error getting document: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error getting document: {str(e)}")
 
 
 @router.post("/documents/search", response_model=List[SearchResult])
 async def search_documents(
-    request: SearchRequest,
-    db: Session = Depends(get_db)
+    request: SearchRequest
 ):
     """Perform vector similarity search on documents or instructions."""
     try:
         if request.search_type == "documents":
-            results = alloydb_service.search_documents(
+            results = await asyncio.to_thread(
+                alloydb_service.search_documents,
                 query_text=request.query,
                 limit=request.limit
             )
             return [
-                SearchResult(
-                    id=UUID(r['id']),
+                SearchResult.model_construct(
+                    id=r['id'],
                     similarity=r['similarity'],
                     title=r['title'],
                     brief=r['brief']
@@ -229,13 +333,14 @@ async def search_documents(
                 for r in results
             ]
         elif request.search_type == "instructions":
-            results = alloydb_service.search_instructions(
+            results = await asyncio.to_thread(
+                alloydb_service.search_instructions,
                 query_text=request.query,
                 limit=request.limit
             )
             return [
-                SearchResult(
-                    id=UUID(r['id']),
+                SearchResult.model_construct(
+                    id=r['id'],
                     similarity=r['similarity'],
                     header=r['header'],
                     instruction=r['instruction'],
@@ -251,7 +356,7 @@ async def search_documents(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error searching: {str(e)}", exc_info=True)
+        logger.error("Error searching: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error searching: {str(e)}")
 
 
@@ -259,29 +364,28 @@ async def search_documents(
 async def list_drive_files():
     """List all PDF files available in Google Drive folder."""
     try:
-        files = drive_service.list_pdf_files()
+        files = await asyncio.to_thread(drive_service.list_pdf_files)
         return {
             'files': files,
             'count': len(files)
         }
     except Exception as e:
-        logger.error(f"Error listing Drive files: {str(e)}", exc_info=True)
+        logger.error("Error listing Drive files: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error listing Drive files: {str(e)}")
 
 
 @router.delete("/documents/{doc_id}", status_code=204)
 async def delete_document(
-    doc_id: UUID,
-    db: Session = Depends(get_db)
+    doc_id: UUID
 ):
     """Delete a document and all its instructions."""
     try:
-        deleted = alloydb_service.delete_document(doc_id)
+        deleted = await asyncio.to_thread(alloydb_service.delete_document, doc_id)
         if not deleted:
             raise HTTPException(status_code=404, detail=f"Document {doc_id} not found")
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error deleting document: {str(e)}", exc_info=True)
+        logger.error("Error deleting document: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error deleting document: {str(e)}")
 
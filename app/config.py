@@ -1,20 +1,42 @@
 """Application configuration."""
 import os
 import logging
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
 from pathlib import Path
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Request ID of the HTTP request being served; set by the middleware in app.main.
+# asyncio.to_thread copies the context, so worker threads log the same ID.
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request ID to every log record."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+# Log level and optional log file (empty LOG_FILE logs to stderr only)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FILE = os.environ.get("LOG_FILE", "app.log")
+
 # Configure logging
+_log_handlers = [logging.StreamHandler()]
+if LOG_FILE:
+    _log_handlers.append(RotatingFileHandler(LOG_FILE, maxBytes=10 * 1024 * 1024, backupCount=5))
+for _handler in _log_handlers:
+    _handler.addFilter(RequestIdFilter())
+
 logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('app.log')
-    ]
+    level=LOG_LEVEL,
+    format='%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s',
+    handlers=_log_handlers
 )
 
 logger = logging.getLogger(__name__)
@@ -28,6 +50,41 @@ GOOGLE_DRIVE_FOLDER_ID = os.environ.get("GOOGLE_DRIVE_FOLDER_ID")
 VERTEX_AI_EMBEDDING_MODEL = os.environ.get("VERTEX_AI_EMBEDDING_MODEL", "text-embedding-005")
 GEMINI_MODEL_NAME = os.environ.get("GEMINI_MODEL_NAME", "gemini-2.5-flash")
 
+# Number of Uvicorn worker processes when started via `python -m app.main`. Workers share no
+# memory, so set it to match --workers when running uvicorn directly
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", "1"))
+if WEB_CONCURRENCY < 1:
+    logger.warning("WEB_CONCURRENCY=%s is not a valid number of workers, using 1", WEB_CONCURRENCY)
+    WEB_CONCURRENCY = 1
+
+# Database connections held by each worker process; the defaults split 10 (+20 overflow)
+# connections across all workers instead of opening that many per worker
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", max(2, 10 // WEB_CONCURRENCY)))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", max(0, 20 // WEB_CONCURRENCY)))
+
+# Maximum number of documents processed concurrently by the batch endpoint
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "10"))
+
+# Time-to-live in seconds for cached Google Drive file metadata
+DRIVE_CACHE_TTL = int(os.environ.get("DRIVE_CACHE_TTL", "900"))
+
+# Time-to-live in seconds for cached Google Drive folder listings
+DRIVE_LIST_CACHE_TTL = int(os.environ.get("DRIVE_LIST_CACHE_TTL", "60"))
+
+# Time-to-live in seconds for cached document and instruction reads; 0 disables the cache.
+# Writes only invalidate the cache of the worker that made them, so it is always off with
+# more than one worker
+DOCUMENT_CACHE_TTL = int(os.environ.get("DOCUMENT_CACHE_TTL", "60")) if WEB_CONCURRENCY == 1 else 0
+
+# Directory for Gemini extraction results cached by PDF content hash
+PDF_CACHE_DIR = os.path.expanduser(os.environ.get("PDF_CACHE_DIR", "~/.cache/pdf2alloydb/extractions"))
+
+# Maximum number of cached extractions; least recently used entries beyond it are deleted (0: no limit)
+PDF_CACHE_MAX_ENTRIES = int(os.environ.get("PDF_CACHE_MAX_ENTRIES", "1000"))
+
+# Set to 1 to always call Gemini, e.g. in CI
+PDF_CACHE_DISABLE = os.environ.get("PDF_CACHE_DISABLE", "").lower() in ("1", "true", "yes")
+
 # Validate required environment variables
 required_vars = {
     "ALLOYDB_CONNECTION_STRING": ALLOYDB_CONNECTION_STRING,
@@ -36,5 +93,5 @@ required_vars = {
 
 missing_vars = [var for var, value in required_vars.items() if not value]
 if missing_vars:
-    logger.warning(f"Missing environment variables: {', '.join(missing_vars)}")
+    logger.warning("Missing environment variables: %s", ', '.join(missing_vars))
 
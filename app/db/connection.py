@@ -5,16 +5,22 @@ from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import QueuePool
 from contextlib import contextmanager
 from typing import Generator, Optional
+import threading
 import time
 
-from app.config import ALLOYDB_CONNECTION_STRING, logger
+from app.config import ALLOYDB_CONNECTION_STRING, DB_POOL_SIZE, DB_MAX_OVERFLOW, logger
 from app.models.database import Base
 
 logger = logging.getLogger(__name__)
 
-# Global engine and session factory
+# Global engine and session factory (created lazily, see ensure_db_initialized)
 engine: Optional[create_engine] = None
 SessionLocal: Optional[sessionmaker] = None
+_init_lock = threading.Lock()
+
+# Last health probe result as (monotonic timestamp, healthy); see test_connection(max_age=...)
+_last_health_check: Optional[tuple] = None
+_health_lock = threading.Lock()
 
 
 def create_engine_with_pooling(connection_string: str):
@@ -30,13 +36,18 @@ def create_engine_with_pooling(connection_string: str):
     return create_engine(
         connection_string,
         poolclass=QueuePool,
-        pool_size=3,  # Reduced pool size to prevent connection exhaustion
-        max_overflow=5,  # Reduced overflow to prevent too many connections
+        pool_size=DB_POOL_SIZE,  # Persistent connections of this worker process
+        max_overflow=DB_MAX_OVERFLOW,  # Extra connections allowed under bursts
         pool_timeout=20,  # Timeout for getting connection from pool
         pool_recycle=1800,  # Recycle connections after 30 minutes (prevent stale connections)
         pool_pre_ping=True,  # Verify connections before using (auto-recovery)
         echo=False,  # Set to True for SQL query logging
         future=True,
+        # psycopg2 bulk execution: multi-row INSERTs are batched into VALUES pages,
+        # other executemany statements use execute_batch
+        executemany_mode="values_plus_batch",
+        insertmanyvalues_page_size=1000,
+        executemany_batch_page_size=500,
         connect_args={
             "connect_timeout": 15,  # Increased connection timeout to 15 seconds
             "options": "-c statement_timeout=300000 -c idle_in_transaction_session_timeout=60000"  # 5 min statement timeout, 1 min idle transaction timeout
@@ -59,12 +70,23 @@ def initialize_db():
         SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
         logger.info("Database engine initialized with connection pooling")
     except Exception as e:
-        logger.error(f"Failed to initialize database engine: {str(e)}")
+        logger.error("Failed to initialize database engine: %s", e)
         engine = None
         SessionLocal = None
         raise
 
 
+def ensure_db_initialized():
+    """Initialize the database engine on first use if it hasn't been created yet."""
+    if SessionLocal is not None or not ALLOYDB_CONNECTION_STRING:
+        return
+    
+    with _init_lock:
+        # Another thread may have initialized while we waited for the lock
+        if SessionLocal is None:
+            initialize_db()
+
+
 def dispose_engine(force: bool = False):
     """
     Dispose of the current engine and close all connections.
@@ -82,7 +104,7 @@ def dispose_engine(force: bool = False):
             # Dispose the engine
             engine.dispose(close=True)
         except Exception as e:
-            logger.warning(f"Error disposing engine (this may be normal): {str(e)}")
+            logger.warning("Error disposing engine (this may be normal): %s", e)
             if force:
                 # Force close by setting to None
                 try:
@@ -117,7 +139,7 @@ def reconnect_db(max_attempts: int = 3, wait_between_attempts: int = 3):
     last_error = None
     for attempt in range(max_attempts):
         try:
-            logger.info(f"Reconnection attempt {attempt + 1}/{max_attempts}")
+            logger.info("Reconnection attempt %s/%s", attempt + 1, max_attempts)
             initialize_db()
             
             # Test the connection
@@ -125,58 +147,78 @@ def reconnect_db(max_attempts: int = 3, wait_between_attempts: int = 3):
                 logger.info("Database reconnection successful")
                 return
             else:
-                logger.warning(f"Reconnection attempt {attempt + 1} succeeded but connection test failed")
+                logger.warning("Reconnection attempt %s succeeded but connection test failed", attempt + 1)
                 dispose_engine()
                 
         except Exception as e:
             last_error = e
-            logger.warning(f"Reconnection attempt {attempt + 1} failed: {str(e)}")
+            logger.warning("Reconnection attempt %s failed: %s", attempt + 1, e)
             if attempt < max_attempts - 1:
                 wait_time = wait_between_attempts * (2 ** attempt)  # Exponential backoff
-                logger.info(f"Waiting {wait_time} seconds before next attempt...")
+                logger.info("Waiting %s seconds before next attempt...", wait_time)
                 time.sleep(wait_time)
                 dispose_engine()  # Ensure clean state
     
     # If all attempts failed, raise the last error
     if last_error:
-        logger.error(f"Failed to reconnect after {max_attempts} attempts")
+        logger.error("Failed to reconnect after %s attempts", max_attempts)
         raise last_error
     else:
         raise RuntimeError("Failed to reconnect: connection test failed after all attempts")
 
 
-def test_connection(timeout: int = 5) -> bool:
+def test_connection(timeout: int = 5, max_age: float = 0.0) -> bool:
     """
     Test database connection health with timeout.
     
     Args:
         timeout: Timeout in seconds for the test query
+        max_age: Reuse the previous result if it is younger than this many seconds.
+            Frequent health probes then cost at most one query per max_age, and
+            concurrent callers wait for the in-flight probe instead of piling onto the pool.
         
     Returns:
         True if connection is healthy, False otherwise
     """
+    global _last_health_check
+    
+    with _health_lock:
+        if max_age > 0 and _last_health_check is not None:
+            checked_at, healthy = _last_health_check
+            if time.monotonic() - checked_at < max_age:
+                return healthy
+        
+        healthy = _probe_connection(timeout)
+        _last_health_check = (time.monotonic(), healthy)
+        return healthy
+
+
+def _probe_connection(timeout: int) -> bool:
+    """Run SELECT 1 on a raw AUTOCOMMIT connection, without the session retry/reconnect logic."""
+    try:
+        ensure_db_initialized()
+    except Exception as e:
+        logger.error("Database initialization failed: %s", e)
+        return False
+    
     if not engine or not SessionLocal:
         return False
     
     try:
-        # Use a simple query with timeout
-        with get_db_context() as db:
-            db.execute(text("SELECT 1"))
+        # Plain pooled connection: a failing probe must never trigger reconnect_db
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("SELECT 1"))
             return True
     except Exception as e:
         error_str = str(e).lower()
         # Don't log timeout errors as errors, just return False
         if 'timeout' in error_str:
-            logger.warning(f"Database connection test timed out after {timeout}s")
+            logger.warning("Database connection test timed out after %ss", timeout)
         else:
-            logger.error(f"Database connection test failed: {str(e)}")
+            logger.error("Database connection test failed: %s", e)
         return False
 
 
-# Initialize on module import
-initialize_db()
-
-
 def get_db() -> Generator[Session, None, None]:
     """
     Dependency function for FastAPI to get database session.
@@ -184,6 +226,7 @@ def get_db() -> Generator[Session, None, None]:
     Yields:
         Database session
     """
+    ensure_db_initialized()
     if not SessionLocal:
         raise RuntimeError("Database connection not configured. Set ALLOYDB_CONNECTION_STRING.")
     
@@ -202,6 +245,7 @@ def get_db_context() -> Generator[Session, None, None]:
     Yields:
         Database session
     """
+    ensure_db_initialized()
     if not SessionLocal:
         raise RuntimeError("Database connection not configured. Set ALLOYDB_CONNECTION_STRING.")
     
@@ -218,7 +262,7 @@ def get_db_context() -> Generator[Session, None, None]:
                 # Check if it's a connection error
                 error_str = str(e).lower()
                 if any(keyword in error_str for keyword in ['connection', 'closed', 'lost', 'timeout', 'broken']):
-                    logger.warning(f"Database connection error (attempt {attempt + 1}/{max_retries}): {str(e)}")
+                    logger.warning("Database connection error (attempt %s/%s): %s", attempt + 1, max_retries, e)
                     db.close()
                     if attempt < max_retries - 1:
                         # Try to reconnect
@@ -233,13 +277,14 @@ def get_db_context() -> Generator[Session, None, None]:
                         pass
         except Exception as e:
             if attempt == max_retries - 1:
-                logger.error(f"Failed to get database connection after {max_retries} attempts: {str(e)}")
+                logger.error("Failed to get database connection after %s attempts: %s", max_retries, e)
                 raise
             time.sleep(0.5)  # Brief pause before retry
 
 
 def init_db():
     """Initialize database tables (create if not exist)."""
+    ensure_db_initialized()
     if engine:
         Base.metadata.create_all(bind=engine)
         logger.info("Database tables initialized")
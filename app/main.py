@@ -1,10 +1,14 @@
 """FastAPI application entry point."""
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+import asyncio
 import logging
+import uuid
+from datetime import timedelta
 
 from app.api.routes import documents
-from app.config import logger
+from app.config import logger, request_id_var
 
 # Logging is already configured in app.config
 # Just get the logger for this module
@@ -14,7 +18,8 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="PDF2AlloyDB API",
     description="API for processing PDF documents from Google Drive and storing in AlloyDB",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse  # orjson serializes large lists much faster than json
 )
 
 # CORS middleware
@@ -26,10 +31,85 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    """Tag logs of a request with its X-Request-ID (generated if the client sent none)."""
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
 # Include routers
 app.include_router(documents.router, prefix="/api", tags=["documents"])
 
 
+@app.on_event("startup")
+async def initialize_database():
+    """
+    Connect to the database and create missing tables.
+    
+    Failures are logged but don't abort startup: the engine is also created lazily
+    on first use, so the API can serve /health and recover once AlloyDB is reachable.
+    """
+    from app.db.connection import ensure_db_initialized, init_db
+    
+    max_attempts = 3
+    for attempt in range(max_attempts):
+        try:
+            await asyncio.to_thread(ensure_db_initialized)
+            await asyncio.to_thread(init_db)
+            return
+        except Exception as e:
+            logger.warning("Database initialization attempt %s/%s failed: %s", attempt + 1, max_attempts, e)
+            if attempt < max_attempts - 1:
+                await asyncio.sleep(2)
+    
+    logger.error("Database not initialized at startup; will retry on first request")
+
+
+@app.on_event("startup")
+async def prime_drive_cache():
+    """Warm the Drive metadata cache with a single folder listing."""
+    from app.services.drive_service import drive_service
+    
+    try:
+        await asyncio.to_thread(drive_service.list_pdf_files)
+    except Exception as e:
+        # The cache fills lazily on demand, so startup must not fail here
+        logger.warning("Could not prime Drive metadata cache: %s", e)
+
+
+@app.on_event("startup")
+async def fail_interrupted_jobs():
+    """
+    Mark jobs left pending/processing by a previous run as failed.
+    
+    With several workers, a restarted worker must not fail jobs that its siblings are
+    still running, so only jobs without any update for an hour are swept then.
+    """
+    from app.config import WEB_CONCURRENCY
+    from app.services.alloydb_service import alloydb_service
+    
+    older_than = None if WEB_CONCURRENCY == 1 else timedelta(hours=1)
+    try:
+        await asyncio.to_thread(alloydb_service.fail_interrupted_jobs, older_than)
+    except Exception as e:
+        logger.warning("Could not clean up interrupted processing jobs: %s", e)
+
+
+@app.on_event("shutdown")
+async def stop_ingest_executor():
+    """Stop the batch ingestion threads, dropping ingests that haven't started yet."""
+    from app.workers.tasks import ingest_executor
+    ingest_executor.shutdown(wait=False, cancel_futures=True)
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
@@ -41,7 +121,8 @@ async def health_check():
     """Health check endpoint with database connection test."""
     from app.db.connection import test_connection
     
-    db_healthy = test_connection()
+    # Probes (e.g. a 1 Hz liveness check) share one database round-trip per 2 seconds
+    db_healthy = await asyncio.to_thread(test_connection, max_age=2.0)
     status = "healthy" if db_healthy else "unhealthy"
     
     return {
@@ -56,22 +137,21 @@ async def reconnect_database():
     Manually reconnect to the database. Use this if database becomes unresponsive.
     This will close all existing connections and create new ones.
     """
-    import time
     from app.db.connection import reconnect_db, test_connection, dispose_engine
     
     try:
         # First, try to dispose of any stuck connections
         logger.info("Attempting to dispose of existing connections...")
-        dispose_engine(force=True)
+        await asyncio.to_thread(dispose_engine, force=True)
         
         # Wait a moment for connections to close
-        time.sleep(2)
+        await asyncio.sleep(2)
         
-        # Now try to reconnect
-        reconnect_db(max_attempts=3, wait_between_attempts=3)
+        # Now try to reconnect (blocking retries run in a worker thread)
+        await asyncio.to_thread(reconnect_db, max_attempts=3, wait_between_attempts=3)
         
         # Test the connection
-        is_healthy = test_connection()
+        is_healthy = await asyncio.to_thread(test_connection)
         
         if is_healthy:
             return {
@@ -87,7 +167,7 @@ async def reconnect_database():
             }
     except Exception as e:
         error_msg = str(e)
-        logger.error(f"Error reconnecting to database: {error_msg}")
+        logger.error("Error reconnecting to database: %s", error_msg)
         
         # Provide helpful error message
         if "timeout" in error_msg.lower():
@@ -107,11 +187,15 @@ async def reconnect_database():
 
 if __name__ == "__main__":
     import uvicorn
+    from app.config import WEB_CONCURRENCY
     # Configure uvicorn to use the same logging configuration
     uvicorn.run(
-        app, 
+        "app.main:app",  # Import string is required to run multiple workers
         host="127.0.0.1", 
         port=8000,
+        workers=WEB_CONCURRENCY,
+        loop="auto",  # uvloop when installed (uvicorn[standard]), asyncio otherwise (e.g. Windows)
+        http="auto",  # httptools when installed
         log_config=None,  # Use Python's logging configuration instead of uvicorn's
         access_log=True   # Enable access logs
     )
@@ -1,5 +1,5 @@
 """SQLAlchemy ORM models for database tables."""
-from sqlalchemy import Column, String, Text, Integer, ARRAY, DateTime, ForeignKey
+from sqlalchemy import Column, String, Text, Integer, ARRAY, DateTime, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func
@@ -28,6 +28,13 @@ class Document(Base):
     # Relationship to instructions
     instructions = relationship("Instruction", back_populates="document", cascade="all, delete-orphan")
     
+    # Index serving keyset pagination on (created_at, id) (same as sql/init_schema.sql). The
+    # ScaNN embedding index is only created by sql/init_schema.sql: it needs the AlloyDB
+    # alloydb_scann extension, which plain Postgres/pgvector databases don't have
+    __table_args__ = (
+        Index("idx_documents_created_at_id", "created_at", "id"),
+    )
+    
     def __repr__(self):
         return f"<Document(id={self.id}, filename='{self.filename}', title='{self.title}')>"
 
@@ -51,3 +58,25 @@ class Instruction(Base):
     def __repr__(self):
         return f"<Instruction(id={self.id}, parent_id={self.parent_id}, page={self.page}, header='{self.header[:50]}...')>"
 
+
+
+class ProcessingJob(Base):
+    """ORM model for processing_jobs table."""
+    __tablename__ = "processing_jobs"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    file_id = Column(String(255))
+    filename = Column(String(255))
+    status = Column(String(20), nullable=False, default="pending")  # pending, processing, completed, failed
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="SET NULL"))
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    # Named as in sql/init_schema.sql, so both setup paths create the same index
+    __table_args__ = (
+        Index("idx_processing_jobs_status", "status"),
+    )
+    
+    def __repr__(self):
+        return f"<ProcessingJob(id={self.id}, status='{self.status}', filename='{self.filename}')>"
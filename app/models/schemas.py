@@ -1,28 +1,34 @@
 """Pydantic schemas for API request/response models."""
-from pydantic import BaseModel, Field, conlist
+from pydantic import BaseModel, ConfigDict, Field, conlist
 from typing import Optional, List
+from typing_extensions import Annotated, TypedDict
 from datetime import datetime
 from uuid import UUID
 
 
-class SewingSentense(BaseModel):
+# Leaf types only used as items of larger models are TypedDicts: Pydantic validates them
+# with a flat dict schema instead of constructing a BaseModel instance per list item.
+
+class SewingSentense(TypedDict):
     """Represents a parsed sewing instruction sentence."""
-    action: str = Field(
+    action: Annotated[str, Field(
         description="Sentence with subject, predicate and object, describing an action of sewing instruction"
-    )
-    subject: str = Field(description="A subject of sewing instruction")
-    predicat: str = Field(description="A predicate of sewing instruction")
-    object_: str = Field(description="An object of sewing instruction")
+    )]
+    subject: Annotated[str, Field(description="A subject of sewing instruction")]
+    predicat: Annotated[str, Field(description="A predicate of sewing instruction")]
+    object_: Annotated[str, Field(description="An object of sewing instruction")]
 
 
-class ImageWithText(BaseModel):
+class ImageWithText(TypedDict):
     """Represents an instruction with associated image bounding box."""
-    page: int = Field(description="Page number")
-    header: str = Field(description="Section header")
-    instruction: str = Field(description="Text with steps of sewing instruction")
-    box_2d: conlist(item_type=int, min_length=4, max_length=4) = Field(
+    page: Annotated[int, Field(description="Page number")]
+    header: Annotated[str, Field(description="Section header")]
+    instruction: Annotated[str, Field(description="Text with steps of sewing instruction")]
+    # Stays a list: Gemini's response schema has no fixed-length tuple (prefixItems) support,
+    # and psycopg2 adapts lists, not tuples, to the integer[] column
+    box_2d: Annotated[conlist(item_type=int, min_length=4, max_length=4), Field(
         description="The bounding box of the image that best fits the instruction [y1, x1, y2, x2]"
-    )
+    )]
 
 
 class Instructions(BaseModel):
@@ -73,8 +79,16 @@ class DocumentResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class DocumentPage(BaseModel):
+    """Response model for one page of documents."""
+    items: List[DocumentResponse]
+    next_cursor: Optional[str] = Field(
+        default=None,
+        description="Opaque cursor for the next page; null when this is the last page"
+    )
 
 
 class InstructionResponse(BaseModel):
@@ -84,11 +98,10 @@ class InstructionResponse(BaseModel):
     page: int
     header: str
     instruction: str
-    box_2d: List[int]
+    box_2d: List[int]  # integer[] rows come back as lists and are passed through model_construct
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class ProcessDocumentRequest(BaseModel):
@@ -120,3 +133,24 @@ class DocumentWithInstructions(BaseModel):
     document: DocumentResponse
     instructions: List[InstructionResponse]
 
+
+
+class JobResponse(BaseModel):
+    """Response model for a background processing job."""
+    id: UUID
+    file_id: Optional[str]
+    filename: Optional[str]
+    status: str
+    document_id: Optional[UUID]
+    error: Optional[str]
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class JobSubmittedResponse(BaseModel):
+    """Response model returned when a document is queued for processing."""
+    job_id: UUID
+    status: str
+    status_url: str
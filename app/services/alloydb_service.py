@@ -1,28 +1,115 @@
 """AlloyDB service for database operations and AI function calls."""
 import logging
-from typing import List, Optional, Dict, Any
+import threading
+import orjson
+from array import array
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any, Tuple
 from uuid import UUID
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import text, select, delete, update, func, bindparam, tuple_, Integer, String
+from cachetools import TTLCache, LRUCache
+from pgvector.sqlalchemy import Vector
 
+from app.config import DOCUMENT_CACHE_TTL, VERTEX_AI_EMBEDDING_MODEL
 from app.db.connection import get_db_context
-from app.models.database import Document, Instruction
+from app.models.database import Document, Instruction, ProcessingJob
 from app.models.schemas import Instructions, ImageWithText
 
 logger = logging.getLogger(__name__)
 
+# Stores a document and all its instructions in one call. Instructions travel as one JSON
+# array and are inserted by a single INSERT ... SELECT, with embeddings generated server-side.
+# COPY ... FROM STDIN is not an option here: COPY cannot evaluate google_ml.embedding(),
+# and the embedding vectors never leave the database.
+STORE_DOCUMENT_WITH_INSTRUCTIONS_SQL = text("""
+    SELECT store_document_with_instructions(
+        :filename, :title, :brief, :specifications,
+        :production_package, :fabric_consumption, :preprocessings,
+        CAST(:instructions AS jsonb)
+    ) AS doc_id
+""")
+
+# Hot-path statements are built once with typed bind parameters, so each call skips
+# constructing the text() clause and inferring parameter types
+EMBED_QUERY_SQL = text(
+    "SELECT google_ml.embedding(:model, :query_text)::real[] AS embedding"
+).bindparams(
+    bindparam('model', type_=String),
+    bindparam('query_text', type_=String)
+)
+SEARCH_DOCUMENTS_SQL = text(
+    "SELECT * FROM search_documents_by_embedding(CAST(:query_embedding AS vector), :limit_count)"
+).bindparams(
+    bindparam('query_embedding', type_=Vector(768)),
+    bindparam('limit_count', type_=Integer)
+)
+SEARCH_INSTRUCTIONS_SQL = text(
+    "SELECT * FROM search_instructions_by_embedding(CAST(:query_embedding AS vector), :limit_count)"
+).bindparams(
+    bindparam('query_embedding', type_=Vector(768)),
+    bindparam('limit_count', type_=Integer)
+)
+EXISTING_DOCUMENTS_SQL = text(
+    "SELECT id, filename FROM documents WHERE filename = ANY(:filenames)"
+)
+
+# Columns returned by read methods; the 768-dim embedding (~3KB per row) is never needed.
+# Reads select these through Core and return plain dicts: no identity map, instance state
+# or expunge bookkeeping for data that is only serialized.
+DOCUMENT_READ_COLUMNS = (
+    Document.id, Document.filename, Document.title, Document.brief,
+    Document.specifications, Document.production_package,
+    Document.fabric_consumption, Document.preprocessings,
+    Document.created_at, Document.updated_at
+)
+INSTRUCTION_READ_COLUMNS = (
+    Instruction.id, Instruction.parent_id, Instruction.page,
+    Instruction.header, Instruction.instruction, Instruction.box_2d,
+    Instruction.created_at
+)
+
 
 class AlloyDBService:
     """Service for AlloyDB operations using SQL functions and ORM."""
     
+    def __init__(self):
+        """Initialize read-through caches for documents and their instructions."""
+        self._document_cache = TTLCache(maxsize=1024, ttl=DOCUMENT_CACHE_TTL)
+        self._instructions_cache = TTLCache(maxsize=1024, ttl=DOCUMENT_CACHE_TTL)
+        self._cache_lock = threading.Lock()
+        # Off with several workers, see DOCUMENT_CACHE_TTL
+        self._read_cache_enabled = DOCUMENT_CACHE_TTL > 0
+        # Bumped by every invalidation; a read only fills the cache if no invalidation ran
+        # since it started, so a row fetched before a write or delete is never cached after it
+        self._cache_generation = 0
+        # Search queries repeat a lot; embedding them is a Vertex AI call of 50-200ms
+        # Vectors are kept as float32 arrays (~3KB each) rather than tuples of boxed floats (~25KB)
+        self._query_embedding_cache = LRUCache(maxsize=1024)
+        self._query_embedding_lock = threading.Lock()
+    
+    def _invalidate_document_cache(self, doc_id: UUID) -> None:
+        """Drop cached reads for a document after it has been written or deleted."""
+        with self._cache_lock:
+            self._cache_generation += 1
+            self._document_cache.pop(str(doc_id), None)
+            self._instructions_cache.pop(str(doc_id), None)
+    
+    def _cache_fill(self, cache: TTLCache, doc_id: UUID, value: Any, generation: int) -> None:
+        """Cache a read result unless the cache was invalidated while it was being read."""
+        with self._cache_lock:
+            if generation == self._cache_generation:
+                cache[str(doc_id)] = value
+    
     def store_document_with_instructions(
         self,
         filename: str,
         instructions_data: Instructions
     ) -> UUID:
         """
-        Store a document and its instructions using AlloyDB SQL functions.
-        This replaces the VectorizedTutorial function logic.
+        Store a document and its instructions with the store_document_with_instructions
+        SQL function. This replaces the VectorizedTutorial function logic.
         
         Args:
             filename: Name of the PDF file
@@ -31,144 +118,199 @@ class AlloyDBService:
         Returns:
             UUID of the created document
         """
+        params = {
+            'filename': filename,
+            'title': instructions_data.title,
+            'brief': instructions_data.brief or '',
+            'specifications': instructions_data.specifications or '',
+            'production_package': instructions_data.production_package or '',
+            'fabric_consumption': instructions_data.fabric_consumption or '',
+            'preprocessings': instructions_data.preprocessings or '',
+            'instructions': orjson.dumps(instructions_data.list_instructions).decode()
+        }
+        
+        # One round-trip; the function is atomic, and get_db_context rolls back on failure
         with get_db_context() as db:
-            try:
-                # Call SQL function to store document with embedding
-                result = db.execute(
-                    text("""
-                        SELECT store_document(
-                            :filename, :title, :brief, :specifications,
-                            :production_package, :fabric_consumption, :preprocessings
-                        ) as doc_id
-                    """),
-                    {
-                        'filename': filename,
-                        'title': instructions_data.title,
-                        'brief': instructions_data.brief or '',
-                        'specifications': instructions_data.specifications or '',
-                        'production_package': instructions_data.production_package or '',
-                        'fabric_consumption': instructions_data.fabric_consumption or '',
-                        'preprocessings': instructions_data.preprocessings or ''
-                    }
-                )
-                
-                doc_id = result.scalar()
-                
-                # Store each instruction
-                for instr in instructions_data.list_instructions:
-                    db.execute(
-                        text("""
-                            SELECT store_instruction(
-                                :parent_id, :page, :header, :instruction, :box_2d
-                            )
-                        """),
-                        {
-                            'parent_id': doc_id,
-                            'page': instr.page,
-                            'header': instr.header,
-                            'instruction': instr.instruction,
-                            'box_2d': instr.box_2d
-                        }
-                    )
-                
-                db.commit()
-                logger.info(f"Stored document {filename} with {len(instructions_data.list_instructions)} instructions")
-                
-                return doc_id
-                
-            except Exception as e:
-                logger.error(f"Error storing document: {str(e)}")
-                db.rollback()
-                raise
+            doc_id = UUID(str(db.execute(STORE_DOCUMENT_WITH_INSTRUCTIONS_SQL, params).scalar()))
+            db.commit()
+        
+        self._invalidate_document_cache(doc_id)
+        logger.info("Stored document %s with %s instructions", filename, len(instructions_data.list_instructions))
+        return doc_id
     
-    def get_document(self, doc_id: UUID) -> Optional[Document]:
+    def session(self):
+        """
+        Open a database session that several calls can share, e.g.
+        ``with alloydb_service.session() as db: ...get_document(doc_id, db=db)``.
+        Saves a pool checkout and transaction per call in multi-query handlers.
         """
-        Get a document by ID.
+        return get_db_context()
+    
+    def _session_scope(self, db: Optional[Session]):
+        """Reuse a caller-supplied session, or open a new one."""
+        return nullcontext(db) if db is not None else get_db_context()
+    
+    def get_document(self, doc_id: UUID, db: Optional[Session] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get a document by ID. Results are cached for DOCUMENT_CACHE_TTL seconds.
         
         Args:
             doc_id: Document UUID
+            db: Optional open session to run the query in
             
         Returns:
-            Document object or None (expunged from session)
+            Document row as a dictionary, or None
         """
-        with get_db_context() as db:
-            document = db.query(Document).filter(Document.id == doc_id).first()
-            if document:
-                # Expunge the object from the session so it can be used outside the context
-                # Access all attributes first to ensure they're loaded
-                _ = document.id, document.filename, document.title, document.brief
-                _ = document.specifications, document.production_package
-                _ = document.fabric_consumption, document.preprocessings
-                _ = document.created_at, document.updated_at
-                db.expunge(document)
+        if self._read_cache_enabled:
+            with self._cache_lock:
+                cached = self._document_cache.get(str(doc_id))
+                generation = self._cache_generation
+            if cached is not None:
+                return cached
+        
+        with self._session_scope(db) as db:
+            row = db.execute(
+                select(*DOCUMENT_READ_COLUMNS).where(Document.id == doc_id)
+            ).mappings().first()
+            document = dict(row) if row else None
+            if document and self._read_cache_enabled:
+                self._cache_fill(self._document_cache, doc_id, document, generation)
             return document
     
-    def get_document_by_filename(self, filename: str) -> Optional[Document]:
+    def get_document_by_filename(
+        self,
+        filename: str,
+        db: Optional[Session] = None
+    ) -> Optional[Dict[str, Any]]:
         """
         Get a document by filename.
         
         Args:
             filename: Document filename
+            db: Optional open session to run the query in
             
         Returns:
-            Document object or None (expunged from session)
+            Document row as a dictionary, or None
         """
+        with self._session_scope(db) as db:
+            row = db.execute(
+                select(*DOCUMENT_READ_COLUMNS).where(Document.filename == filename)
+            ).mappings().first()
+            return dict(row) if row else None
+    
+    def get_existing_documents(self, filenames: List[str]) -> Dict[str, UUID]:
+        """
+        Find which of the given filenames are already stored, in a single query.
+        
+        Args:
+            filenames: Document filenames to look up
+            
+        Returns:
+            Dictionary mapping each stored filename to its document UUID
+        """
+        if not filenames:
+            return {}
+        
         with get_db_context() as db:
-            document = db.query(Document).filter(Document.filename == filename).first()
-            if document:
-                # Expunge the object from the session so it can be used outside the context
-                # Access all attributes first to ensure they're loaded
-                _ = document.id, document.filename, document.title, document.brief
-                _ = document.specifications, document.production_package
-                _ = document.fabric_consumption, document.preprocessings
-                _ = document.created_at, document.updated_at
-                db.expunge(document)
-            return document
+            result = db.execute(
+                EXISTING_DOCUMENTS_SQL,
+                {'filenames': list(filenames)}
+            )
+            return {row.filename: row.id for row in result}
     
-    def list_documents(self, limit: int = 100, offset: int = 0) -> List[Document]:
+    def list_documents(
+        self,
+        limit: int = 100,
+        offset: int = 0,
+        cursor: Optional[Tuple[datetime, UUID]] = None,
+        db: Optional[Session] = None
+    ) -> List[Dict[str, Any]]:
         """
-        List all documents with pagination.
+        List documents, newest first, with pagination.
+        
+        Prefer ``cursor`` over ``offset``: the keyset condition seeks straight to the page,
+        while OFFSET scans and discards every skipped row.
         
         Args:
             limit: Maximum number of documents to return
-            offset: Number of documents to skip
+            offset: Number of documents to skip (ignored when cursor is given)
+            cursor: (created_at, id) of the last document of the previous page
+            db: Optional open session to run the query in
             
         Returns:
-            List of Document objects (expunged from session)
+            List of document rows as dictionaries
         """
-        with get_db_context() as db:
-            documents = db.query(Document).order_by(Document.created_at.desc()).limit(limit).offset(offset).all()
-            # Expunge all documents from the session
-            for document in documents:
-                # Access all attributes first to ensure they're loaded
-                _ = document.id, document.filename, document.title, document.brief
-                _ = document.specifications, document.production_package
-                _ = document.fabric_consumption, document.preprocessings
-                _ = document.created_at, document.updated_at
-                db.expunge(document)
-            return documents
+        with self._session_scope(db) as db:
+            query = (
+                select(*DOCUMENT_READ_COLUMNS)
+                .order_by(Document.created_at.desc(), Document.id.desc())
+            )
+            if cursor:
+                query = query.where(tuple_(Document.created_at, Document.id) < tuple_(*cursor))
+            elif offset:
+                query = query.offset(offset)
+            rows = db.execute(query.limit(limit)).mappings().all()
+            return [dict(row) for row in rows]
     
-    def get_document_instructions(self, doc_id: UUID) -> List[Instruction]:
+    def get_document_instructions(
+        self,
+        doc_id: UUID,
+        db: Optional[Session] = None
+    ) -> List[Dict[str, Any]]:
         """
-        Get all instructions for a document.
+        Get all instructions for a document. Results are cached for DOCUMENT_CACHE_TTL seconds.
         
         Args:
             doc_id: Document UUID
+            db: Optional open session to run the query in
             
         Returns:
-            List of Instruction objects (expunged from session)
+            List of instruction rows as dictionaries
         """
-        with get_db_context() as db:
-            instructions = db.query(Instruction).filter(Instruction.parent_id == doc_id).order_by(Instruction.page, Instruction.id).all()
-            # Expunge all instructions from the session
-            for instruction in instructions:
-                # Access all attributes first to ensure they're loaded
-                _ = instruction.id, instruction.parent_id, instruction.page
-                _ = instruction.header, instruction.instruction, instruction.box_2d
-                _ = instruction.created_at
-                db.expunge(instruction)
+        if self._read_cache_enabled:
+            with self._cache_lock:
+                cached = self._instructions_cache.get(str(doc_id))
+                generation = self._cache_generation
+            if cached is not None:
+                return cached
+        
+        with self._session_scope(db) as db:
+            rows = db.execute(
+                select(*INSTRUCTION_READ_COLUMNS)
+                .where(Instruction.parent_id == doc_id)
+                .order_by(Instruction.page, Instruction.id)
+            ).mappings().all()
+            instructions = [dict(row) for row in rows]
+            if self._read_cache_enabled:
+                self._cache_fill(self._instructions_cache, doc_id, instructions, generation)
             return instructions
     
+    def _embed_query(self, db: Session, query_text: str) -> array:
+        """
+        Get the embedding for a search query, generating it in AlloyDB on a cache miss.
+        
+        Args:
+            db: Open database session
+            query_text: Search query text
+            
+        Returns:
+            Query embedding as a float32 array
+        """
+        with self._query_embedding_lock:
+            cached = self._query_embedding_cache.get(query_text)
+        if cached is not None:
+            return cached
+        
+        # The model must match the one used by the functions in sql/create_ai_functions.sql
+        embedding = array('f', db.execute(
+            EMBED_QUERY_SQL,
+            {'model': VERTEX_AI_EMBEDDING_MODEL, 'query_text': query_text}
+        ).scalar())
+        
+        with self._query_embedding_lock:
+            self._query_embedding_cache[query_text] = embedding
+        return embedding
+    
     def search_documents(
         self,
         query_text: str,
@@ -185,21 +327,14 @@ class AlloyDBService:
             List of search results with similarity scores
         """
         with get_db_context() as db:
+            query_embedding = self._embed_query(db, query_text)
             result = db.execute(
-                text("SELECT * FROM search_documents(:query_text, :limit_count)"),
-                {'query_text': query_text, 'limit_count': limit}
+                SEARCH_DOCUMENTS_SQL,
+                {'query_embedding': list(query_embedding), 'limit_count': limit}
             )
             
-            return [
-                {
-                    'id': row.id,
-                    'filename': row.filename,
-                    'title': row.title,
-                    'brief': row.brief,
-                    'similarity': float(row.similarity)
-                }
-                for row in result
-            ]
+            # similarity is double precision in SQL, so rows need no per-field conversion
+            return [dict(row) for row in result.mappings()]
     
     def search_instructions(
         self,
@@ -217,22 +352,13 @@ class AlloyDBService:
             List of search results with similarity scores
         """
         with get_db_context() as db:
+            query_embedding = self._embed_query(db, query_text)
             result = db.execute(
-                text("SELECT * FROM search_instructions(:query_text, :limit_count)"),
-                {'query_text': query_text, 'limit_count': limit}
+                SEARCH_INSTRUCTIONS_SQL,
+                {'query_embedding': list(query_embedding), 'limit_count': limit}
             )
             
-            return [
-                {
-                    'id': row.id,
-                    'parent_id': row.parent_id,
-                    'page': row.page,
-                    'header': row.header,
-                    'instruction': row.instruction,
-                    'similarity': float(row.similarity)
-                }
-                for row in result
-            ]
+            return [dict(row) for row in result.mappings()]
     
     def delete_document(self, doc_id: UUID) -> bool:
         """
@@ -244,14 +370,111 @@ class AlloyDBService:
         Returns:
             True if deleted, False if not found
         """
+        # One statement; instructions go with it through the ON DELETE CASCADE foreign key
         with get_db_context() as db:
-            document = db.query(Document).filter(Document.id == doc_id).first()
-            if document:
-                db.delete(document)
-                db.commit()
-                logger.info(f"Deleted document {doc_id}")
-                return True
+            deleted_id = db.execute(
+                delete(Document).where(Document.id == doc_id).returning(Document.id)
+            ).scalar()
+            db.commit()
+        
+        if deleted_id is None:
             return False
+        
+        self._invalidate_document_cache(doc_id)
+        logger.info("Deleted document %s", doc_id)
+        return True
+
+    
+    def create_job(self, file_id: Optional[str] = None, filename: Optional[str] = None) -> UUID:
+        """
+        Create a pending background processing job.
+        
+        Args:
+            file_id: Google Drive file ID
+            filename: Filename to process (if file_id not provided)
+            
+        Returns:
+            UUID of the created job
+        """
+        with get_db_context() as db:
+            job = ProcessingJob(file_id=file_id, filename=filename, status="pending")
+            db.add(job)
+            db.flush()
+            job_id = job.id
+            db.commit()
+            logger.info("Created processing job %s", job_id)
+            return job_id
+    
+    def update_job(
+        self,
+        job_id: UUID,
+        status: str,
+        document_id: Optional[UUID] = None,
+        error: Optional[str] = None
+    ) -> None:
+        """
+        Update the status of a background processing job.
+        
+        Args:
+            job_id: Job UUID
+            status: New job status (pending, processing, completed, failed)
+            document_id: UUID of the stored document, once known
+            error: Error message if the job failed
+        """
+        with get_db_context() as db:
+            job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
+            if not job:
+                logger.warning("Processing job %s not found", job_id)
+                return
+            job.status = status
+            if document_id is not None:
+                job.document_id = document_id
+            if error is not None:
+                job.error = error
+            db.commit()
+    
+    def fail_interrupted_jobs(self, older_than: Optional[timedelta] = None) -> int:
+        """
+        Mark pending and processing jobs as failed. Jobs run in-process, so after a restart
+        nothing will ever finish these.
+        
+        Args:
+            older_than: Only fail jobs not updated for this long, for when other worker
+                processes may still be running their own jobs; None fails all of them
+            
+        Returns:
+            Number of jobs marked as failed
+        """
+        statement = (
+            update(ProcessingJob)
+            .where(ProcessingJob.status.in_(("pending", "processing")))
+            .values(status="failed", error="Interrupted by a server restart", updated_at=func.now())
+        )
+        if older_than is not None:
+            statement = statement.where(ProcessingJob.updated_at < func.now() - older_than)
+        
+        with get_db_context() as db:
+            count = db.execute(statement).rowcount
+            db.commit()
+        if count:
+            logger.warning("Marked %s interrupted processing jobs as failed", count)
+        return count
+    
+    def get_job(self, job_id: UUID) -> Optional[Dict[str, Any]]:
+        """
+        Get a background processing job by ID.
+        
+        Args:
+            job_id: Job UUID
+            
+        Returns:
+            Job row as a dictionary, or None
+        """
+        with get_db_context() as db:
+            row = db.execute(
+                select(ProcessingJob.__table__).where(ProcessingJob.id == job_id)
+            ).mappings().first()
+            return dict(row) if row else None
 
 
 # Global instance
@@ -1,4 +1,8 @@
+"""Google Cloud authentication and shared API clients."""
 import os
+import json
+import threading
+from functools import lru_cache
 from google.oauth2 import service_account
 from google.cloud import storage
 from google import genai
@@ -7,9 +11,21 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+
+@lru_cache(maxsize=4)
+def _load_service_account_info(path: str, mtime: float) -> dict:
+    """Parse a service account key file; mtime is part of the cache key so edits are picked up."""
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
 class GoogleCloudAuth:
     def __init__(self):
         self.credentials = None
+        # clients are built on first use and then shared; building one sets up its own
+        # transport and credential refresh, so there is no point in doing it twice
+        self._clients = {}
+        self._clients_lock = threading.Lock()
         self._initialize_credentials()
     
     def _initialize_credentials(self):
@@ -18,8 +34,8 @@ class GoogleCloudAuth:
         
         if service_account_path and os.path.exists(service_account_path):
             # Use service account key file
-            self.credentials = service_account.Credentials.from_service_account_file(
-                service_account_path,
+            self.credentials = service_account.Credentials.from_service_account_info(
+                _load_service_account_info(service_account_path, os.path.getmtime(service_account_path)),
                 scopes=[
                     'https://www.googleapis.com/auth/cloud-platform',
                     'https://www.googleapis.com/auth/drive.readonly'
@@ -29,25 +45,43 @@ class GoogleCloudAuth:
             # Fallback to application default credentials
             import google.auth
             self.credentials, _ = google.auth.default()
+        
+        self._service_account_email = self._read_service_account_email()
+    
+    def _get_client(self, name, factory):
+        """Return the shared client stored under name, creating it with factory on first use."""
+        client = self._clients.get(name)
+        if client is None:
+            with self._clients_lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = self._clients[name] = factory()
+        return client
     
     def get_storage_client(self):
         """Get authenticated Google Cloud Storage client."""
-        return storage.Client(credentials=self.credentials)
+        return self._get_client('storage', lambda: storage.Client(credentials=self.credentials))
     
     def get_gemini_client(self):
         """Get authenticated Gemini client."""
         project_id = os.environ.get("GOOGLE_CLOUD_PROJECT")
         location = os.environ.get("GOOGLE_CLOUD_REGION")
         
-        return genai.Client(
+        return self._get_client('gemini', lambda: genai.Client(
             project=project_id,
             location=location,
             credentials=self.credentials
-        )
+        ))
     
     def get_drive_client(self):
-        """Get authenticated Google Drive API client."""
-        return build('drive', 'v3', credentials=self.credentials)
+        """
+        Get authenticated Google Drive API client.
+        
+        The client's default transport is not thread-safe; concurrent callers should
+        pass their own http to execute() (see DriveService).
+        """
+        # cache_discovery=False skips the (unavailable) oauth2client file cache lookup on every build
+        return self._get_client('drive', lambda: build('drive', 'v3', credentials=self.credentials, cache_discovery=False))
     
     def get_service_account_email(self) -> str:
         """
@@ -57,18 +91,20 @@ class GoogleCloudAuth:
         Returns:
             Service account email address
         """
+        return self._service_account_email
+    
+    def _read_service_account_email(self) -> str:
+        """Look up the service account email once, when credentials are initialized."""
         if hasattr(self.credentials, 'service_account_email'):
             return self.credentials.service_account_email
         elif hasattr(self.credentials, '_service_account_email'):
             return self.credentials._service_account_email
         else:
             # Try to get from the credentials file
-            import json
             service_account_path = os.environ.get("GOOGLE_SERVICE_CREDENTIALS")
             if service_account_path and os.path.exists(service_account_path):
-                with open(service_account_path, 'r') as f:
-                    key_data = json.load(f)
-                    return key_data.get('client_email', 'Unknown')
+                key_data = _load_service_account_info(service_account_path, os.path.getmtime(service_account_path))
+                return key_data.get('client_email', 'Unknown')
             return 'Unknown'
 
 # Global instance
@@ -0,0 +1,115 @@
+"""In-memory TTL cache for Google Drive file metadata."""
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from cachetools import TTLCache
+
+from app.config import DRIVE_CACHE_TTL, DRIVE_LIST_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+class DriveMetadataCache:
+    """
+    Thread-safe cache of Drive file metadata, keyed by file ID and by (folder ID, file name),
+    plus whole folder listings keyed by (folder ID, query).
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 10_000,
+        ttl: int = DRIVE_CACHE_TTL,
+        listing_ttl: int = DRIVE_LIST_CACHE_TTL
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            maxsize: Maximum number of entries per index
+            ttl: Time-to-live of a file entry in seconds
+            listing_ttl: Time-to-live of a folder listing in seconds; kept short so
+                newly uploaded files show up quickly
+        """
+        self._by_id = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._by_name = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._listings = TTLCache(maxsize=64, ttl=listing_ttl)
+        self._lock = threading.RLock()
+
+    def get_by_id(self, file_id: str) -> Optional[Dict[str, str]]:
+        """Return cached metadata for a file ID, or None on a miss."""
+        with self._lock:
+            return self._by_id.get(file_id)
+
+    def get_by_name(self, folder_id: str, filename: str) -> Optional[Dict[str, str]]:
+        """Return cached metadata for a file name within a folder, or None on a miss."""
+        with self._lock:
+            return self._by_name.get((folder_id, filename))
+
+    def put(self, file_info: Dict[str, str], folder_id: Optional[str] = None) -> None:
+        """
+        Store file metadata.
+
+        Args:
+            file_info: File metadata containing at least 'id' and 'name'
+            folder_id: Folder the file belongs to; required to index the file by name
+        """
+        with self._lock:
+            previous = self._by_id.get(file_info['id'])
+            if previous is not None and (
+                previous.get('modifiedTime') != file_info.get('modifiedTime')
+                or previous.get('name') != file_info.get('name')
+            ):
+                # The file changed in Drive since it was cached; drop what was derived from it
+                logger.debug("Drive file %s changed, invalidating cached metadata", file_info['id'])
+                self._drop_file(file_info['id'])
+            self._by_id[file_info['id']] = file_info
+            if folder_id and file_info.get('name'):
+                self._by_name[(folder_id, file_info['name'])] = file_info
+
+    def get_listing(self, folder_id: str, query: str) -> Optional[List[Dict[str, str]]]:
+        """Return a cached folder listing for a query, or None on a miss."""
+        with self._lock:
+            files = self._listings.get((folder_id, query))
+        return list(files) if files is not None else None
+
+    def put_listing(self, folder_id: str, query: str, files: List[Dict[str, str]]) -> None:
+        """Store the result of a folder listing query."""
+        with self._lock:
+            self._listings[(folder_id, query)] = tuple(files)
+
+    def invalidate(
+        self,
+        file_id: Optional[str] = None,
+        filename: Optional[str] = None,
+        folder_id: Optional[str] = None
+    ) -> None:
+        """
+        Drop cached metadata for a file ID and/or a file name within a folder.
+
+        Dropping a file ID also drops its name entries and all folder listings, which
+        would otherwise keep handing out the stale ID.
+        """
+        with self._lock:
+            if file_id:
+                self._drop_file(file_id)
+            if filename and folder_id:
+                self._by_name.pop((folder_id, filename), None)
+
+    def _drop_file(self, file_id: str) -> None:
+        """Remove every entry referring to a file ID; the caller holds the lock."""
+        self._by_id.pop(file_id, None)
+        for key in [key for key, info in self._by_name.items() if info.get('id') == file_id]:
+            self._by_name.pop(key, None)
+        self._listings.clear()
+
+    def clear(self) -> None:
+        """Drop all cached metadata."""
+        with self._lock:
+            self._by_id.clear()
+            self._by_name.clear()
+            self._listings.clear()
+
+
+# Global instance
+drive_cache = DriveMetadataCache()
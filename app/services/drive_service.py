@@ -1,24 +1,34 @@
 """Google Drive service for accessing and downloading PDF files."""
 import os
+import asyncio
 import tempfile
+import threading
 import logging
-from typing import List, Optional, Dict
+from itertools import islice
+from typing import Iterator, List, Optional, Dict
 from pathlib import Path
+from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaIoBaseDownload
+from google_auth_httplib2 import AuthorizedHttp
+import httplib2
 import io
 import ssl
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
-import sys
-from pathlib import Path
+from app.services.auth_service import auth_service
+from app.config import GOOGLE_DRIVE_FOLDER_ID, BATCH_CONCURRENCY
+from app.services.drive_cache import drive_cache
+
+logger = logging.getLogger(__name__)
 
-# Add parent directory to path to import auth_service
-sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+# Download chunk size; the MediaIoBaseDownload default (100 KiB) needs hundreds of requests per PDF
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
 
-from auth_service import auth_service
-from app.config import GOOGLE_DRIVE_FOLDER_ID
+# Maximum number of calls Drive accepts in one batch request
+DRIVE_BATCH_SIZE = 100
 
-logger = logging.getLogger(__name__)
+# Metadata fetched for single files; modifiedTime lets the cache notice changed files
+FILE_FIELDS = "id, name, mimeType, size, modifiedTime"
 
 
 class DriveService:
@@ -28,10 +38,24 @@ class DriveService:
         """Initialize Drive service with authenticated client."""
         self.drive_client = auth_service.get_drive_client()
         self.folder_id = GOOGLE_DRIVE_FOLDER_ID
+        self._local = threading.local()
         
         if not self.folder_id:
             logger.warning("GOOGLE_DRIVE_FOLDER_ID not set. Drive operations may fail.")
     
+    def _thread_http(self) -> AuthorizedHttp:
+        """
+        Get an authorized HTTP transport owned by the calling thread.
+        
+        httplib2 connections are not thread-safe, so requests made concurrently from
+        worker threads must not share the transport the Drive client was built with.
+        """
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = AuthorizedHttp(auth_service.credentials, http=httplib2.Http())
+            self._local.http = http
+        return http
+    
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=2, max=10),
@@ -41,6 +65,7 @@ class DriveService:
     def get_file_info(self, file_id: str) -> Dict[str, str]:
         """
         Get file metadata by file ID with retry logic for SSL errors.
+        Results are served from the Drive metadata cache when available.
         
         Args:
             file_id: Google Drive file ID
@@ -48,68 +73,185 @@ class DriveService:
         Returns:
             Dictionary with file metadata
         """
+        cached = drive_cache.get_by_id(file_id)
+        if cached:
+            return cached
+        
         try:
-            return self.drive_client.files().get(
+            file_info = self.drive_client.files().get(
                 fileId=file_id,
+                fields=FILE_FIELDS,
                 supportsAllDrives=True
-            ).execute()
+            ).execute(http=self._thread_http())
+            drive_cache.put(file_info)
+            return file_info
         except ssl.SSLError as e:
-            logger.warning(f"SSL error getting file info for {file_id}, will retry: {str(e)}")
+            logger.warning("SSL error getting file info for %s, will retry: %s", file_id, e)
             raise
         except (ConnectionError, OSError) as e:
-            logger.warning(f"Network error getting file info for {file_id}, will retry: {str(e)}")
+            logger.warning("Network error getting file info for %s, will retry: %s", file_id, e)
             raise
     
-    def list_pdf_files(self, folder_id: Optional[str] = None) -> List[Dict[str, str]]:
+    def get_files_info(self, file_ids: List[str]) -> Dict[str, Dict[str, str]]:
         """
-        List all PDF files in the specified Google Drive folder.
+        Get metadata for several files, fetching cache misses with Drive batch requests
+        (one HTTP round-trip per DRIVE_BATCH_SIZE files).
         
         Args:
-            folder_id: Google Drive folder ID. If None, uses GOOGLE_DRIVE_FOLDER_ID from config.
+            file_ids: Google Drive file IDs
             
         Returns:
-            List of dictionaries containing file metadata: id, name, mimeType
+            Dictionary mapping file IDs to metadata; files that could not be fetched are
+            left out (get_file_info raises the actual error when they are used)
         """
-        target_folder = folder_id or self.folder_id
+        found = {}
+        missing = []
+        for file_id in dict.fromkeys(file_ids):
+            cached = drive_cache.get_by_id(file_id)
+            if cached:
+                found[file_id] = cached
+            else:
+                missing.append(file_id)
         
-        if not target_folder:
-            raise ValueError("No folder ID provided and GOOGLE_DRIVE_FOLDER_ID not set")
+        def _on_response(request_id, response, exception):
+            if exception is not None:
+                logger.warning("Could not get file info for %s: %s", request_id, exception)
+                return
+            drive_cache.put(response)
+            found[request_id] = response
         
+        for start in range(0, len(missing), DRIVE_BATCH_SIZE):
+            batch = self.drive_client.new_batch_http_request(callback=_on_response)
+            for file_id in missing[start:start + DRIVE_BATCH_SIZE]:
+                batch.add(
+                    self.drive_client.files().get(fileId=file_id, fields=FILE_FIELDS, supportsAllDrives=True),
+                    request_id=file_id
+                )
+            batch.execute(http=self._thread_http())
+        
+        return found
+    
+    def _folder_name(self, folder_id: str) -> str:
+        """Get a folder's name for log messages, through the Drive metadata cache."""
+        cached = drive_cache.get_by_id(folder_id)
+        if cached:
+            return cached.get('name', folder_id)
         try:
-            # First, verify we can access the folder
-            try:
-                folder_info = self.drive_client.files().get(
-                    fileId=target_folder,
-                    fields="id, name, mimeType",
-                    supportsAllDrives=True  # Required for Shared Drives
-                ).execute()
-                logger.info(f"Accessing folder: {folder_info.get('name')} (ID: {target_folder})")
-            except Exception as e:
-                logger.error(f"Cannot access folder {target_folder}. Error: {str(e)}")
-                logger.error("Make sure the service account has access to this folder.")
-                raise
-            
-            # Query for PDF files in the folder
-            query = f"'{target_folder}' in parents and mimeType='application/pdf' and trashed=false"
-            logger.debug(f"Query: {query}")
+            folder_info = self.drive_client.files().get(
+                fileId=folder_id,
+                fields=FILE_FIELDS,
+                supportsAllDrives=True
+            ).execute(http=self._thread_http())
+        except Exception:
+            return folder_id
+        drive_cache.put(folder_info)
+        return folder_info.get('name', folder_id)
+    
+    def _iter_files(self, query: str, page_size: int) -> Iterator[Dict[str, str]]:
+        """
+        Yield files matching a Drive query, fetching result pages lazily via pageToken.
+        
+        Args:
+            query: Drive search query
+            page_size: Number of files requested per page (Drive allows at most 1000)
             
+        Yields:
+            Dictionaries containing file metadata: id, name, mimeType, size, modifiedTime
+        """
+        page_token = None
+        while True:
             results = self.drive_client.files().list(
                 q=query,
-                fields="files(id, name, mimeType, size, modifiedTime)",
+                fields="nextPageToken, files(id, name, mimeType, size, modifiedTime)",
                 orderBy="name",
-                pageSize=1000,  # Increase page size
+                pageSize=page_size,
+                pageToken=page_token,
                 supportsAllDrives=True,  # Required for Shared Drives
                 includeItemsFromAllDrives=True  # Required for Shared Drives
-            ).execute()
+            ).execute(http=self._thread_http())
             
-            files = results.get('files', [])
-            logger.info(f"Found {len(files)} PDF files in folder {target_folder}")
+            for file in results.get('files', []):
+                yield {
+                    'id': file.get('id'),
+                    'name': file.get('name'),
+                    'mimeType': file.get('mimeType'),
+                    'size': file.get('size'),
+                    'modifiedTime': file.get('modifiedTime')
+                }
+            
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return
+    
+    def _resolve_folder(self, folder_id: Optional[str]) -> str:
+        """Return the given folder ID or the configured default."""
+        target_folder = folder_id or self.folder_id
+        if not target_folder:
+            raise ValueError("No folder ID provided and GOOGLE_DRIVE_FOLDER_ID not set")
+        return target_folder
+    
+    def iter_pdf_files(
+        self,
+        folder_id: Optional[str] = None,
+        page_size: int = 200
+    ) -> Iterator[Dict[str, str]]:
+        """
+        Lazily iterate over the PDF files in a Google Drive folder, one page request at a time,
+        so callers can start processing before the whole folder is listed.
+        
+        Args:
+            folder_id: Google Drive folder ID. If None, uses GOOGLE_DRIVE_FOLDER_ID from config.
+            page_size: Number of files requested per page
+            
+        Yields:
+            Dictionaries containing file metadata: id, name, mimeType, size, modifiedTime
+        """
+        target_folder = self._resolve_folder(folder_id)
+        query = f"'{target_folder}' in parents and mimeType='application/pdf' and trashed=false"
+        
+        for file_info in self._iter_files(query, page_size):
+            drive_cache.put(file_info, target_folder)
+            yield file_info
+    
+    def list_pdf_files(
+        self,
+        folder_id: Optional[str] = None,
+        max_files: Optional[int] = None
+    ) -> List[Dict[str, str]]:
+        """
+        List the PDF files in the specified Google Drive folder, following all result pages.
+        
+        Args:
+            folder_id: Google Drive folder ID. If None, uses GOOGLE_DRIVE_FOLDER_ID from config.
+            max_files: Stop after this many files. If None, lists the whole folder.
+            
+        Returns:
+            List of dictionaries containing file metadata: id, name, mimeType
+        """
+        target_folder = self._resolve_folder(folder_id)
+        query = f"'{target_folder}' in parents and mimeType='application/pdf' and trashed=false"
+        
+        # Repeated full listings within DRIVE_LIST_CACHE_TTL cost no Drive calls at all
+        if max_files is None:
+            cached = drive_cache.get_listing(target_folder, query)
+            if cached is not None:
+                return cached
+        
+        try:
+            # No preflight files().get on the folder: an inaccessible folder makes the listing fail
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Listing folder %s (ID: %s)", self._folder_name(target_folder), target_folder)
+                logger.debug("Query: %s", query)
+            
+            page_size = min(max_files, 1000) if max_files else 1000
+            pdf_files = list(islice(self.iter_pdf_files(target_folder, page_size=page_size), max_files))
+            logger.info("Found %s PDF files in folder %s", len(pdf_files), target_folder)
             
             # If no PDFs found, list all files to help debug
-            if len(files) == 0:
+            if len(pdf_files) == 0:
                 logger.warning("No PDF files found. Listing all files in folder for debugging...")
                 all_files = self.list_all_files(target_folder)
-                logger.info(f"Total files in folder: {len(all_files)}")
+                logger.info("Total files in folder: %s", len(all_files))
                 if all_files:
                     logger.info("File types found:")
                     file_types = {}
@@ -117,20 +259,19 @@ class DriveService:
                         mime = f.get('mimeType', 'unknown')
                         file_types[mime] = file_types.get(mime, 0) + 1
                     for mime, count in file_types.items():
-                        logger.info(f"  {mime}: {count}")
+                        logger.info("  %s: %s", mime, count)
             
-            return [
-                {
-                    'id': file.get('id'),
-                    'name': file.get('name'),
-                    'mimeType': file.get('mimeType'),
-                    'size': file.get('size'),
-                    'modifiedTime': file.get('modifiedTime')
-                }
-                for file in files
-            ]
+            if max_files is None:
+                drive_cache.put_listing(target_folder, query, pdf_files)
+            
+            return pdf_files
+        except HttpError as e:
+            logger.error("Cannot list folder %s. Error: %s", target_folder, e)
+            if e.resp.status in (403, 404):
+                logger.error("Make sure the service account has access to this folder.")
+            raise
         except Exception as e:
-            logger.error(f"Error listing PDF files: {str(e)}")
+            logger.error("Error listing PDF files: %s", e)
             raise
     
     def list_all_files(self, folder_id: Optional[str] = None) -> List[Dict[str, str]]:
@@ -144,88 +285,116 @@ class DriveService:
         Returns:
             List of dictionaries containing file metadata
         """
-        target_folder = folder_id or self.folder_id
+        target_folder = self._resolve_folder(folder_id)
+        query = f"'{target_folder}' in parents and trashed=false"
         
-        if not target_folder:
-            raise ValueError("No folder ID provided and GOOGLE_DRIVE_FOLDER_ID not set")
+        cached = drive_cache.get_listing(target_folder, query)
+        if cached is not None:
+            return cached
         
         try:
-            query = f"'{target_folder}' in parents and trashed=false"
-            
-            results = self.drive_client.files().list(
-                q=query,
-                fields="files(id, name, mimeType, size, modifiedTime)",
-                orderBy="name",
-                pageSize=1000,
-                supportsAllDrives=True,  # Required for Shared Drives
-                includeItemsFromAllDrives=True  # Required for Shared Drives
-            ).execute()
-            
-            files = results.get('files', [])
-            return [
-                {
-                    'id': file.get('id'),
-                    'name': file.get('name'),
-                    'mimeType': file.get('mimeType'),
-                    'size': file.get('size'),
-                    'modifiedTime': file.get('modifiedTime')
-                }
-                for file in files
-            ]
+            all_files = list(self._iter_files(query, page_size=1000))
+            drive_cache.put_listing(target_folder, query, all_files)
+            return all_files
         except Exception as e:
-            logger.error(f"Error listing all files: {str(e)}")
+            logger.error("Error listing all files: %s", e)
             raise
     
     def download_file(self, file_id: str, output_path: Optional[str] = None) -> str:
         """
-        Download a file from Google Drive.
+        Download a file from Google Drive, streaming it to disk chunk by chunk.
         
         Args:
             file_id: Google Drive file ID
-            output_path: Optional path to save the file. If None, creates a temporary file.
+            output_path: Optional path to save the file. If None, creates a unique temporary file.
             
         Returns:
             Path to the downloaded file
         """
+        output_file = None
         try:
-            # Get file metadata
-            file_metadata = self.drive_client.files().get(
-                fileId=file_id,
-                supportsAllDrives=True  # Required for Shared Drives
-            ).execute()
+            # Get file metadata (cached)
+            file_metadata = self.get_file_info(file_id)
             file_name = file_metadata.get('name', 'downloaded_file.pdf')
             
-            # Determine output path
+            # Determine output file
             if output_path:
                 output_file = Path(output_path)
+                # Ensure parent directory exists
+                output_file.parent.mkdir(parents=True, exist_ok=True)
+                f = open(output_file, 'wb')
             else:
-                # Create temporary file
-                temp_dir = tempfile.gettempdir()
-                output_file = Path(temp_dir) / file_name
-            
-            # Ensure parent directory exists
-            output_file.parent.mkdir(parents=True, exist_ok=True)
+                # Unique temporary file, so concurrent downloads of same-named files can't collide
+                f = tempfile.NamedTemporaryFile(suffix=Path(file_name).suffix or '.pdf', delete=False)
+                output_file = Path(f.name)
             
             # Download file
             request = self.drive_client.files().get_media(fileId=file_id)
-            with open(output_file, 'wb') as f:
-                downloader = MediaIoBaseDownload(f, request)
+            request.http = self._thread_http()
+            with f:
+                downloader = MediaIoBaseDownload(f, request, chunksize=DOWNLOAD_CHUNK_SIZE)
+                log_progress = logger.isEnabledFor(logging.DEBUG)
                 done = False
                 while not done:
                     status, done = downloader.next_chunk()
-                    if status:
-                        logger.debug(f"Download progress: {int(status.progress() * 100)}%")
+                    if status and log_progress:
+                        logger.debug("Download progress: %s%%", int(status.progress() * 100))
             
-            logger.info(f"Downloaded file {file_name} to {output_file}")
+            logger.info("Downloaded file %s to %s", file_name, output_file)
             return str(output_file)
             
         except Exception as e:
-            logger.error(f"Error downloading file {file_id}: {str(e)}")
+            logger.error("Error downloading file %s: %s", file_id, e)
+            # Cached metadata may be stale (e.g. file deleted or replaced)
+            drive_cache.invalidate(file_id=file_id)
+            # Don't leave a partially written temporary file behind
+            if output_file is not None and not output_path:
+                try:
+                    output_file.unlink(missing_ok=True)
+                except OSError as cleanup_error:
+                    logger.warning("Could not remove partial download %s: %s", output_file, cleanup_error)
             raise
     
+    async def download_many(
+        self,
+        file_ids: List[str],
+        max_concurrency: int = BATCH_CONCURRENCY
+    ) -> List[str]:
+        """
+        Download several files concurrently, each in a worker thread.
+        Metadata for all files is fetched up front with batch requests.
+        
+        Args:
+            file_ids: Google Drive file IDs
+            max_concurrency: Maximum number of downloads in flight
+            
+        Returns:
+            Paths to the downloaded temporary files, in the order of file_ids
+        """
+        await asyncio.to_thread(self.get_files_info, file_ids)
+        
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def _download(file_id):
+            async with semaphore:
+                return await asyncio.to_thread(self.download_file, file_id)
+        
+        results = await asyncio.gather(*[_download(fid) for fid in file_ids], return_exceptions=True)
+        
+        failures = [r for r in results if isinstance(r, Exception)]
+        if failures:
+            # All or nothing: don't leave the successful downloads behind
+            for path in results:
+                if isinstance(path, str):
+                    Path(path).unlink(missing_ok=True)
+            raise failures[0]
+        
+        return results
+    
     def get_file_by_name(self, filename: str, folder_id: Optional[str] = None) -> Optional[Dict[str, str]]:
         """
         Get a file by its name from the specified folder.
+        Results are served from the Drive metadata cache when available.
         
         Args:
             filename: Name of the file to find
@@ -234,10 +403,11 @@ class DriveService:
         Returns:
             Dictionary with file metadata or None if not found
         """
-        target_folder = folder_id or self.folder_id
+        target_folder = self._resolve_folder(folder_id)
         
-        if not target_folder:
-            raise ValueError("No folder ID provided and GOOGLE_DRIVE_FOLDER_ID not set")
+        cached = drive_cache.get_by_name(target_folder, filename)
+        if cached:
+            return cached
         
         try:
             query = f"'{target_folder}' in parents and name='{filename}' and trashed=false"
@@ -247,24 +417,26 @@ class DriveService:
                 fields="files(id, name, mimeType, size, modifiedTime)",
                 supportsAllDrives=True,  # Required for Shared Drives
                 includeItemsFromAllDrives=True  # Required for Shared Drives
-            ).execute()
+            ).execute(http=self._thread_http())
             
             files = results.get('files', [])
             
             if files:
                 file = files[0]
-                return {
+                file_info = {
                     'id': file.get('id'),
                     'name': file.get('name'),
                     'mimeType': file.get('mimeType'),
                     'size': file.get('size'),
                     'modifiedTime': file.get('modifiedTime')
                 }
+                drive_cache.put(file_info, target_folder)
+                return file_info
             
             return None
             
         except Exception as e:
-            logger.error(f"Error finding file {filename}: {str(e)}")
+            logger.error("Error finding file %s: %s", filename, e)
             raise
 
 
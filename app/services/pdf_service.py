@@ -1,29 +1,21 @@
-"""PDF processing service for converting PDFs to images and extracting structured data."""
+"""PDF processing service for extracting structured data from PDFs with Gemini."""
 import os
+import hashlib
 import tempfile
-import subprocess
 import logging
-from pathlib import Path
-from io import BytesIO
-from typing import List, Tuple, Optional
-from PIL import Image
+from typing import Optional
+import orjson
 from google.genai import types
 import ssl
 import httpx
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
-import sys
-from pathlib import Path
-
-# Add parent directory to path to import auth_service
-sys.path.insert(0, str(Path(__file__).parent.parent.parent))
-
-from auth_service import auth_service
-from app.config import GEMINI_MODEL_NAME
+from app.services.auth_service import auth_service
+from app.config import GEMINI_MODEL_NAME, PDF_CACHE_DIR, PDF_CACHE_DISABLE, PDF_CACHE_MAX_ENTRIES
+from app.models.schemas import Instructions
 
 logger = logging.getLogger(__name__)
 
-
 # System instructions for PDF processing
 BOUNDING_BOX_SYSTEM_INSTRUCTIONS = """
 You are experienced patternmaker and garment production technologist. You list a step-by-step guide of creating a garment.
@@ -31,6 +23,41 @@ You retrieve structured data with meaningful information to your knowledge base.
 For better understanding you translate all texts into English if necessary. You detect the bounding boxes for useful images.
 """
 
+# Prompt for structured tutorial extraction
+EXTRACTION_PROMPT = """
+        Detect text blocks and illustrations in this PDF file.
+        Extract name and description of the garment from the following PDF file.
+        Extract specifications, supplying, equipment, and materials. Extract fabric consumption. Extract all preprocessings.
+        Extract section headers.
+        Pay attention only to texts contain detailed sewing instructions in the form of sentences dictating actions.
+        Select the illustrations that best match the instructions. Concatenate instructions which select the same illustration
+        """
+
+
+# Decorated once at import; tenacity creates fresh per-call retry state on each invocation
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=2, min=4, max=30),
+    retry=retry_if_exception_type((
+        ssl.SSLError,
+        httpx.ReadError,
+        httpx.ConnectError,
+        ConnectionError,
+        OSError
+    )),
+    reraise=True
+)
+def _gemini_generate(client: any, model: str, contents: list, config: types.GenerateContentConfig) -> any:
+    """Generate content with retry logic for SSL and network errors."""
+    try:
+        return client.models.generate_content(model=model, contents=contents, config=config)
+    except (ssl.SSLError, httpx.ReadError, httpx.ConnectError) as e:
+        logger.warning("Network/SSL error during Gemini API call, will retry: %s", e)
+        raise
+    except (ConnectionError, OSError) as e:
+        logger.warning("Connection error during Gemini API call, will retry: %s", e)
+        raise
+
 
 class PDFService:
     """Service for processing PDF files."""
@@ -39,69 +66,29 @@ class PDFService:
         """Initialize PDF service with Gemini client."""
         self.gemini_client = auth_service.get_gemini_client()
         self.model_name = GEMINI_MODEL_NAME
+        # Generation config is identical for every request, so build it once
+        self.generate_config = types.GenerateContentConfig(
+            temperature=0.5,
+            response_mime_type="application/json",
+            response_schema=Instructions
+        )
+        # Everything besides the PDF and system instructions that shapes an extraction, so
+        # changing the model, prompt, response schema or generation settings misses old entries
+        self._cache_key_prefix = b"\0".join([
+            self.model_name.encode(),
+            EXTRACTION_PROMPT.encode(),
+            orjson.dumps(Instructions.model_json_schema(), option=orjson.OPT_SORT_KEYS),
+            self.generate_config.model_dump_json(exclude={"response_schema"}, exclude_none=True).encode(),
+        ])
     
-    def convert_pdf_to_images(
-        self, 
-        pdf_path: str, 
-        dpi: int = 300
-    ) -> List[Image.Image]:
-        """
-        Convert PDF pages to PIL Image objects.
-        
-        Args:
-            pdf_path: Path to the PDF file
-            dpi: Resolution for conversion (default: 300)
-            
-        Returns:
-            List of PIL Image objects, one per page
-        """
-        with tempfile.TemporaryDirectory() as tmpdir:
-            output_prefix = os.path.join(tmpdir, "page")
-            
-            # Use Poppler's pdftoppm to convert PDF to PNG
-            try:
-                subprocess.run(
-                    [
-                        "pdftoppm",
-                        "-png",
-                        "-r", str(dpi),
-                        pdf_path,
-                        output_prefix
-                    ],
-                    check=True,
-                    capture_output=True
-                )
-            except subprocess.CalledProcessError as e:
-                logger.error(f"Error converting PDF to images: {e.stderr.decode()}")
-                raise
-            except FileNotFoundError:
-                logger.error("pdftoppm not found. Please install poppler-utils.")
-                raise
-            
-            # Collect all generated PNG images
-            png_files = sorted(Path(tmpdir).glob("*.png"))
-            images = []
-            
-            for image_path in png_files:
-                try:
-                    im = Image.open(BytesIO(open(image_path, "rb").read()))
-                    # Resize to max 1024x1024 while maintaining aspect ratio
-                    im.thumbnail([1024, 1024], Image.Resampling.LANCZOS)
-                    images.append(im)
-                except Exception as e:
-                    logger.warning(f"Error processing image {image_path}: {str(e)}")
-                    continue
-            
-            logger.info(f"Converted {len(images)} pages from PDF {pdf_path}")
-            return images
-    
-    def upload_pdf_to_gemini(self, pdf_path: str) -> any:
+    def prepare_pdf_for_gemini(self, pdf_path: str) -> any:
         """
         Prepare PDF file for Gemini API processing.
         
         With Vertex AI, we read the file and create a Part object
         instead of using files.upload() which is only available
-        in the Gemini Developer client.
+        in the Gemini Developer client. Gemini reads the PDF itself, so
+        no rasterization is needed.
         
         Args:
             pdf_path: Path to the PDF file
@@ -110,7 +97,8 @@ class PDFService:
             Part object containing the PDF data
         """
         try:
-            # Read the PDF file as bytes
+            # Read the PDF file as bytes. Blob.data is validated as bytes and base64-encoded
+            # into the JSON request body, so an mmap or memoryview would be copied anyway
             with open(pdf_path, 'rb') as f:
                 file_data = f.read()
             
@@ -121,28 +109,71 @@ class PDFService:
                 mime_type='application/pdf'
             )
             
-            logger.info(f"Prepared PDF {pdf_path} for Gemini processing")
+            logger.info("Prepared PDF %s for Gemini processing", pdf_path)
             return file_part
             
         except Exception as e:
-            logger.error(f"Error preparing PDF for Gemini: {str(e)}")
+            logger.error("Error preparing PDF for Gemini: %s", e)
             raise
     
-    def get_tutorial_images(self, pdf_path: str) -> Tuple[List[Image.Image], any]:
-        """
-        Convert PDF to images and upload to Gemini.
-        This combines convert_pdf_to_images and upload_pdf_to_gemini.
-        
-        Args:
-            pdf_path: Path to the PDF file
-            
-        Returns:
-            Tuple of (list of PIL Images, Gemini file object)
-        """
-        # images = self.convert_pdf_to_images(pdf_path)
-        gemini_file = self.upload_pdf_to_gemini(pdf_path)
-        
-        return None, gemini_file
+    def _cache_path(self, gemini_file: any, system_instructions: str) -> Optional[str]:
+        """Path of the cached extraction for this PDF and prompt, or None if caching doesn't apply."""
+        data = getattr(getattr(gemini_file, 'inline_data', None), 'data', None)
+        if PDF_CACHE_DISABLE or not data:
+            return None
+        digest = hashlib.sha256(self._cache_key_prefix)
+        digest.update(b"\0")
+        digest.update(system_instructions.encode())
+        digest.update(b"\0")
+        digest.update(data)
+        return os.path.join(PDF_CACHE_DIR, f"{digest.hexdigest()}.json")
+    
+    @staticmethod
+    def _load_cached(cache_path: str) -> Optional[Instructions]:
+        """Load a cached extraction, or None if there is no usable entry."""
+        try:
+            with open(cache_path, 'rb') as f:
+                instructions = Instructions.model_validate_json(f.read())
+            # Refresh the mtime so pruning evicts the least recently used entries
+            os.utime(cache_path)
+            return instructions
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable extraction cache entry %s: %s", cache_path, e)
+            return None
+    
+    @staticmethod
+    def _store_cached(cache_path: str, instructions: Instructions) -> None:
+        """Write an extraction to the cache; failures are logged, never raised."""
+        try:
+            os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+            # Write to a temporary file and rename, so readers never see a partial entry
+            with tempfile.NamedTemporaryFile('w', dir=PDF_CACHE_DIR, suffix='.tmp', delete=False) as f:
+                f.write(instructions.model_dump_json())
+            os.replace(f.name, cache_path)
+            if PDF_CACHE_MAX_ENTRIES:
+                PDFService._prune_cache()
+        except OSError as e:
+            logger.warning("Could not write extraction cache entry %s: %s", cache_path, e)
+    
+    @staticmethod
+    def _prune_cache() -> None:
+        """Delete the least recently used entries beyond PDF_CACHE_MAX_ENTRIES."""
+        entries = []
+        with os.scandir(PDF_CACHE_DIR) as it:
+            for entry in it:
+                if entry.name.endswith('.json'):
+                    try:
+                        entries.append((entry.stat().st_mtime, entry.path))
+                    except FileNotFoundError:
+                        continue  # removed by another worker meanwhile
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - PDF_CACHE_MAX_ENTRIES)]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
     
     def extract_structured_tutorial(
         self, 
@@ -154,71 +185,39 @@ class PDFService:
         This replaces the GetStructuredTutorial function from the notebook.
         
         Args:
-            gemini_file: Gemini file object (from upload_pdf_to_gemini)
+            gemini_file: Gemini file object (from prepare_pdf_for_gemini)
             system_instructions: Optional custom system instructions
             
         Returns:
             Parsed Instructions object (Pydantic model)
         """
-        from app.models.schemas import Instructions
-        
-        prompt = """
-        Detect text blocks and illustrations in this PDF file.
-        Extract name and description of the garment from the following PDF file.
-        Extract specifications, supplying, equipment, and materials. Extract fabric consumption. Extract all preprocessings.
-        Extract section headers.
-        Pay attention only to texts contain detailed sewing instructions in the form of sentences dictating actions.
-        Select the illustrations that best match the instructions. Concatenate instructions which select the same illustration
-        """
-        
         system_instructions = system_instructions or BOUNDING_BOX_SYSTEM_INSTRUCTIONS
         
-        @retry(
-            stop=stop_after_attempt(3),
-            wait=wait_exponential(multiplier=2, min=4, max=30),
-            retry=retry_if_exception_type((
-                ssl.SSLError,
-                httpx.ReadError,
-                httpx.ConnectError,
-                ConnectionError,
-                OSError
-            )),
-            reraise=True
-        )
-        def _generate_with_retry():
-            """Generate content with retry logic for SSL and network errors."""
-            try:
-                return self.gemini_client.models.generate_content(
-                    model=self.model_name,
-                    contents=[
-                        gemini_file,
-                        system_instructions,
-                        prompt,
-                    ],
-                    config=types.GenerateContentConfig(
-                        temperature=0.5,
-                        response_mime_type="application/json",
-                        response_schema=Instructions
-                    )
-                )
-            except (ssl.SSLError, httpx.ReadError, httpx.ConnectError) as e:
-                logger.warning(f"Network/SSL error during Gemini API call, will retry: {str(e)}")
-                raise
-            except (ConnectionError, OSError) as e:
-                logger.warning(f"Connection error during Gemini API call, will retry: {str(e)}")
-                raise
+        cache_path = self._cache_path(gemini_file, system_instructions)
+        if cache_path:
+            cached = self._load_cached(cache_path)
+            if cached is not None:
+                logger.info("Using cached extraction %s", cache_path)
+                return cached
         
         try:
-            response = _generate_with_retry()
+            response = _gemini_generate(
+                self.gemini_client,
+                self.model_name,
+                [gemini_file, system_instructions, EXTRACTION_PROMPT],
+                self.generate_config
+            )
             
-            logger.info(f"Extracted structured data. Tokens used: {response.usage_metadata.total_token_count}")
-            logger.debug(f"Prompt tokens: {response.usage_metadata.prompt_token_count}")
-            logger.debug(f"Output tokens: {response.usage_metadata.candidates_token_count}")
+            logger.info("Extracted structured data. Tokens used: %s", response.usage_metadata.total_token_count)
+            logger.debug("Prompt tokens: %s", response.usage_metadata.prompt_token_count)
+            logger.debug("Output tokens: %s", response.usage_metadata.candidates_token_count)
             
+            if cache_path and response.parsed is not None:
+                self._store_cached(cache_path, response.parsed)
             return response.parsed
             
         except Exception as e:
-            logger.error(f"Error extracting structured tutorial: {str(e)}")
+            logger.error("Error extracting structured tutorial: %s", e)
             raise
 
 
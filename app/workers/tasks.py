@@ -0,0 +1,115 @@
+"""Document processing tasks executed outside the request/response cycle."""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from uuid import UUID
+
+from app.services.drive_service import drive_service
+from app.services.pdf_service import pdf_service
+from app.services.alloydb_service import alloydb_service
+from app.config import BATCH_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+# Dedicated threads for document ingestion. Each ingest blocks for minutes on Gemini, so running
+# them on the default asyncio.to_thread executor would starve read handlers and /health
+ingest_executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix="ingest")
+
+
+def _safe_unlink(path: str) -> None:
+    """Remove a temporary file, logging instead of raising so the original error isn't masked."""
+    try:
+        os.unlink(path)
+        logger.debug("Cleaned up temporary file %s", path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        # Handle OS errors (permissions, file in use, etc.)
+        logger.warning("Could not remove temporary file %s: %s", path, e)
+
+
+def _set_job_status(job_id: UUID, status: str, **fields) -> None:
+    """Record a job status change, logging instead of raising so the task itself never dies on it."""
+    try:
+        alloydb_service.update_job(job_id, status=status, **fields)
+    except Exception as e:
+        logger.error("Could not mark processing job %s as %s: %s", job_id, status, e, exc_info=True)
+
+
+def ingest_document(file_id: str, filename: str) -> UUID:
+    """
+    Download a PDF from Google Drive, extract structured data and store it in AlloyDB.
+
+    This is blocking work; call it from a worker thread, never directly on the event loop.
+
+    Args:
+        file_id: Google Drive file ID
+        filename: Name of the PDF file
+
+    Returns:
+        UUID of the stored document
+    """
+    # Download PDF from Google Drive
+    logger.info("Downloading PDF %s from Google Drive", filename)
+    pdf_path = drive_service.download_file(file_id)
+
+    try:
+        # Upload PDF to Gemini and extract structured data
+        logger.info("Extracting structured data from %s", filename)
+        gemini_file = pdf_service.prepare_pdf_for_gemini(pdf_path)
+        instructions_data = pdf_service.extract_structured_tutorial(gemini_file)
+
+        # Store in AlloyDB using SQL functions
+        logger.info("Storing %s in AlloyDB", filename)
+        return alloydb_service.store_document_with_instructions(
+            filename=filename,
+            instructions_data=instructions_data
+        )
+
+    finally:
+        # Always clean up the downloaded file, whatever happened above
+        _safe_unlink(pdf_path)
+
+
+def process_document_task(
+    job_id: UUID,
+    file_id: Optional[str] = None,
+    filename: Optional[str] = None
+) -> None:
+    """
+    Process a document for a background job and record the outcome on the job.
+
+    Args:
+        job_id: Processing job UUID
+        file_id: Google Drive file ID
+        filename: Filename to process (if file_id not provided)
+    """
+    _set_job_status(job_id, "processing")
+
+    try:
+        if filename:
+            existing_doc = alloydb_service.get_document_by_filename(filename)
+            if not existing_doc:
+                file_info = drive_service.get_file_by_name(filename)
+                if not file_info:
+                    raise ValueError(f"File '{filename}' not found in Google Drive")
+                file_id = file_info['id']
+        else:
+            file_info = drive_service.get_file_info(file_id)
+            filename = file_info.get('name')
+            existing_doc = alloydb_service.get_document_by_filename(filename)
+
+        if existing_doc:
+            logger.info("Document %s already exists, completing job %s", filename, job_id)
+            doc_id = existing_doc['id']
+        else:
+            doc_id = ingest_document(file_id, filename)
+
+    except Exception as e:
+        logger.error("Processing job %s failed: %s", job_id, e, exc_info=True)
+        _set_job_status(job_id, "failed", error=str(e))
+        return
+
+    _set_job_status(job_id, "completed", document_id=doc_id)
+    logger.info("Processing job %s completed", job_id)
@@ -1,11 +1,57 @@
 """API client wrapper for PDF2AlloyDB API."""
-import requests
+import asyncio
+import httpx
 from typing import List, Optional, Dict, Any
 from uuid import UUID
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Same pool sizing and timeouts for the sync client and the async batch client
+CLIENT_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+CLIENT_TIMEOUT = httpx.Timeout(30.0, read=None)
+
+
+async def _batch_async(
+    client: httpx.AsyncClient,
+    url: str,
+    payloads: List[Dict[str, str]],
+    concurrency: int
+) -> Dict[str, Any]:
+    """
+    POST each payload to url, at most concurrency requests in flight at a time.
+    
+    Returns:
+        Result in the shape of /api/documents/batch-process
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def _post(payload):
+        async with semaphore:
+            response = await client.post(url, json=payload)
+            response.raise_for_status()
+            return response.json()
+    
+    results = await asyncio.gather(*[_post(payload) for payload in payloads], return_exceptions=True)
+    
+    document_ids = []
+    errors = []
+    for payload, result in zip(payloads, results):
+        if isinstance(result, Exception):
+            errors.append({
+                'file_id': payload.get('file_id'),
+                'filename': payload.get('filename') or payload.get('file_id'),
+                'error': str(result)
+            })
+        else:
+            document_ids.append(result['id'])
+    
+    return {
+        'processed': len(document_ids),
+        'document_ids': document_ids,
+        'errors': errors
+    }
+
 
 class PDF2AlloyDBClient:
     """Client for interacting with PDF2AlloyDB API."""
@@ -18,7 +64,20 @@ class PDF2AlloyDBClient:
             base_url: Base URL of the API server
         """
         self.base_url = base_url.rstrip('/')
-        self.session = requests.Session()
+        # One pooled client for all calls; connections are kept alive between requests and
+        # HTTP/2 is negotiated where the server offers it. Reads are not time-limited since
+        # /api/documents/process runs the whole extraction before it responds.
+        self.session = httpx.Client(http2=True, limits=CLIENT_LIMITS, timeout=CLIENT_TIMEOUT)
+    
+    def close(self) -> None:
+        """Close the underlying connection pool."""
+        self.session.close()
+    
+    def __enter__(self) -> "PDF2AlloyDBClient":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
     
     def process_document(
         self,
@@ -48,6 +107,49 @@ class PDF2AlloyDBClient:
         response.raise_for_status()
         return response.json()
     
+    def submit_document_job(
+        self,
+        file_id: Optional[str] = None,
+        filename: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Queue a PDF document from Google Drive for background processing.
+        
+        Args:
+            file_id: Google Drive file ID
+            filename: Filename to process (if file_id not provided)
+            
+        Returns:
+            Dictionary with job_id, status and status_url
+        """
+        url = f"{self.base_url}/api/documents/jobs"
+        payload = {}
+        if file_id:
+            payload['file_id'] = file_id
+        elif filename:
+            payload['filename'] = filename
+        else:
+            raise ValueError("Either file_id or filename must be provided")
+        
+        response = self.session.post(url, json=payload)
+        response.raise_for_status()
+        return response.json()
+    
+    def get_job(self, job_id: UUID) -> Dict[str, Any]:
+        """
+        Get the status of a background processing job.
+        
+        Args:
+            job_id: Job UUID
+            
+        Returns:
+            Job status dictionary
+        """
+        url = f"{self.base_url}/api/jobs/{job_id}"
+        response = self.session.get(url)
+        response.raise_for_status()
+        return response.json()
+    
     def batch_process_documents(
         self,
         file_ids: Optional[List[str]] = None,
@@ -74,23 +176,60 @@ class PDF2AlloyDBClient:
         response.raise_for_status()
         return response.json()
     
+    async def batch_process_documents_async(
+        self,
+        file_ids: Optional[List[str]] = None,
+        filenames: Optional[List[str]] = None,
+        concurrency: int = 4
+    ) -> Dict[str, Any]:
+        """
+        Process multiple PDF documents with concurrent /api/documents/process calls.
+        
+        Unlike batch_process_documents, every document gets its own request, so the
+        client controls the fan-out. Without file_ids or filenames, all PDFs in the
+        Drive folder are processed.
+        
+        Args:
+            file_ids: List of Google Drive file IDs
+            filenames: List of filenames to process
+            concurrency: Maximum number of requests in flight
+            
+        Returns:
+            Batch processing result, in the same shape as batch_process_documents
+        """
+        if file_ids:
+            payloads = [{'file_id': file_id} for file_id in file_ids]
+        elif filenames:
+            payloads = [{'filename': filename} for filename in filenames]
+        else:
+            files = (await asyncio.to_thread(self.list_drive_files))['files']
+            payloads = [{'file_id': f['id'], 'filename': f['name']} for f in files]
+        
+        url = f"{self.base_url}/api/documents/process"
+        async with httpx.AsyncClient(http2=True, limits=CLIENT_LIMITS, timeout=CLIENT_TIMEOUT) as client:
+            return await _batch_async(client, url, payloads, concurrency)
+    
     def list_documents(
         self,
         limit: int = 100,
-        offset: int = 0
-    ) -> List[Dict[str, Any]]:
+        offset: int = 0,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
-        List all processed documents.
+        List processed documents, newest first.
         
         Args:
             limit: Maximum number of documents to return
-            offset: Number of documents to skip
+            offset: Number of documents to skip (ignored when cursor is given)
+            cursor: next_cursor returned by the previous page
             
         Returns:
-            List of document dictionaries
+            Dictionary with 'items' (document dictionaries) and 'next_cursor'
         """
         url = f"{self.base_url}/api/documents"
         params = {'limit': limit, 'offset': offset}
+        if cursor:
+            params['cursor'] = cursor
         response = self.session.get(url, params=params)
         response.raise_for_status()
         return response.json()
@@ -1,5 +1,6 @@
 """CLI interface for PDF2AlloyDB client."""
 import argparse
+import asyncio
 import json
 import sys
 from uuid import UUID
@@ -7,10 +8,22 @@ from typing import Optional
 
 from client.api_client import PDF2AlloyDBClient
 
+try:
+    import orjson
+except ImportError:  # the client can run without the server's requirements
+    orjson = None
+
 
 def print_json(data, indent=2):
     """Pretty print JSON data."""
-    print(json.dumps(data, indent=indent, default=str))
+    if orjson is None or indent != 2:
+        print(json.dumps(data, indent=indent, default=str))
+        return
+    # Flush pending print() output first so it stays ahead of the raw bytes
+    sys.stdout.flush()
+    sys.stdout.buffer.write(orjson.dumps(data, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    sys.stdout.buffer.write(b"\n")
+    sys.stdout.buffer.flush()
 
 
 def process_document_cmd(args, client: PDF2AlloyDBClient):
@@ -27,13 +40,49 @@ def process_document_cmd(args, client: PDF2AlloyDBClient):
         sys.exit(1)
 
 
+def submit_job_cmd(args, client: PDF2AlloyDBClient):
+    """Submit a background processing job command."""
+    try:
+        result = client.submit_document_job(
+            file_id=args.file_id,
+            filename=args.filename
+        )
+        print("Document queued for processing:")
+        print_json(result)
+    except Exception as e:
+        print(f"Error submitting document job: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def get_job_cmd(args, client: PDF2AlloyDBClient):
+    """Get job status command."""
+    try:
+        job_id = UUID(args.job_id)
+        result = client.get_job(job_id)
+        print_json(result)
+    except ValueError:
+        print(f"Invalid UUID: {args.job_id}", file=sys.stderr)
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error getting job: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
 def batch_process_cmd(args, client: PDF2AlloyDBClient):
     """Batch process documents command."""
     try:
-        result = client.batch_process_documents(
-            file_ids=args.file_ids,
-            filenames=args.filenames
-        )
+        if args.concurrency > 1:
+            # Fan out one process call per document from the client side
+            result = asyncio.run(client.batch_process_documents_async(
+                file_ids=args.file_ids,
+                filenames=args.filenames,
+                concurrency=args.concurrency
+            ))
+        else:
+            result = client.batch_process_documents(
+                file_ids=args.file_ids,
+                filenames=args.filenames
+            )
         print(f"Batch processing completed:")
         print(f"  Processed: {result['processed']} documents")
         if result.get('errors'):
@@ -49,9 +98,11 @@ def batch_process_cmd(args, client: PDF2AlloyDBClient):
 def list_documents_cmd(args, client: PDF2AlloyDBClient):
     """List documents command."""
     try:
-        documents = client.list_documents(limit=args.limit, offset=args.offset)
-        print(f"Found {len(documents)} documents:")
-        print_json(documents)
+        page = client.list_documents(limit=args.limit, offset=args.offset, cursor=args.cursor)
+        print(f"Found {len(page['items'])} documents:")
+        print_json(page['items'])
+        if page.get('next_cursor'):
+            print(f"\nMore documents available, continue with: --cursor '{page['next_cursor']}'")
     except Exception as e:
         print(f"Error listing documents: {e}", file=sys.stderr)
         sys.exit(1)
@@ -161,16 +212,33 @@ def main():
     process_group.add_argument('--file-id', help='Google Drive file ID')
     process_group.add_argument('--filename', help='Filename to process')
     
+    # Submit background job command
+    submit_parser = subparsers.add_parser('submit', help='Queue a PDF document for background processing')
+    submit_group = submit_parser.add_mutually_exclusive_group(required=True)
+    submit_group.add_argument('--file-id', help='Google Drive file ID')
+    submit_group.add_argument('--filename', help='Filename to process')
+    
+    # Job status command
+    job_parser = subparsers.add_parser('job', help='Get the status of a background processing job')
+    job_parser.add_argument('job_id', help='Job UUID')
+    
     # Batch process command
     batch_parser = subparsers.add_parser('batch-process', help='Process multiple PDF documents. If no file-ids or filenames provided, processes all PDFs in the folder.')
     batch_group = batch_parser.add_mutually_exclusive_group(required=False)
     batch_group.add_argument('--file-ids', nargs='+', help='List of Google Drive file IDs')
     batch_group.add_argument('--filenames', nargs='+', help='List of filenames to process')
+    batch_parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=1,
+        help='Send up to N concurrent per-document requests instead of one batch request (default: 1)'
+    )
     
     # List documents command
     list_parser = subparsers.add_parser('list', help='List all processed documents')
     list_parser.add_argument('--limit', type=int, default=100, help='Maximum number of documents')
     list_parser.add_argument('--offset', type=int, default=0, help='Number of documents to skip')
+    list_parser.add_argument('--cursor', help='Cursor printed by the previous page (takes precedence over --offset)')
     
     # Get document command
     get_parser = subparsers.add_parser('get', help='Get a document with instructions')
@@ -206,11 +274,11 @@ def main():
         parser.print_help()
         sys.exit(1)
     
-    client = PDF2AlloyDBClient(base_url=args.base_url)
-    
     # Route to appropriate command handler
     commands = {
         'process': process_document_cmd,
+        'submit': submit_job_cmd,
+        'job': get_job_cmd,
         'batch-process': batch_process_cmd,
         'list': list_documents_cmd,
         'get': get_document_cmd,
@@ -221,7 +289,8 @@ def main():
         'reconnect-db': reconnect_db_cmd
     }
     
-    commands[args.command](args, client)
+    with PDF2AlloyDBClient(base_url=args.base_url) as client:
+        commands[args.command](args, client)
 
 
 if __name__ == '__main__':
@@ -88,10 +88,72 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
--- Function to perform vector similarity search on documents
+-- Function to store all instructions of a document in one call
+-- p_rows is a JSON array of {"page", "header", "instruction", "box_2d"} objects;
+-- a single INSERT ... SELECT replaces one store_instruction call per row
+CREATE OR REPLACE FUNCTION store_instructions_bulk(
+    p_parent_id UUID,
+    p_rows JSONB
+)
+RETURNS INTEGER AS $$
+DECLARE
+    inserted_count INTEGER;
+BEGIN
+    INSERT INTO instructions (
+        parent_id, page, header, instruction, box_2d, embedding
+    )
+    SELECT
+        p_parent_id,
+        (r->>'page')::INTEGER,
+        r->>'header',
+        r->>'instruction',
+        -- Ordered explicitly: box_2d is positional ([y1, x1, y2, x2])
+        ARRAY(SELECT e::INTEGER FROM jsonb_array_elements_text(r->'box_2d') WITH ORDINALITY AS t(e, n) ORDER BY n),
+        -- Same embedding input as store_instruction
+        google_ml.embedding(
+            'text-embedding-005',
+            'Header: ' || COALESCE(r->>'header', '') || E'\n' ||
+            'Instruction: ' || COALESCE(r->>'instruction', '')
+        )::vector(768)
+    FROM jsonb_array_elements(p_rows) AS r;
+    
+    GET DIAGNOSTICS inserted_count = ROW_COUNT;
+    RETURN inserted_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function to store a document and all its instructions in a single atomic call
+-- Storing an existing filename again replaces its instructions instead of duplicating them
+CREATE OR REPLACE FUNCTION store_document_with_instructions(
+    p_filename VARCHAR(255),
+    p_title TEXT,
+    p_brief TEXT,
+    p_specifications TEXT,
+    p_production_package TEXT,
+    p_fabric_consumption TEXT,
+    p_preprocessings TEXT,
+    p_instructions JSONB
+)
+RETURNS UUID AS $$
+DECLARE
+    doc_id UUID;
+BEGIN
+    doc_id := store_document(
+        p_filename, p_title, p_brief, p_specifications,
+        p_production_package, p_fabric_consumption, p_preprocessings
+    );
+    
+    DELETE FROM instructions WHERE parent_id = doc_id;
+    PERFORM store_instructions_bulk(doc_id, COALESCE(p_instructions, '[]'::jsonb));
+    
+    RETURN doc_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function to perform vector similarity search on documents with a precomputed query embedding
 -- Returns documents ordered by cosine similarity
-CREATE OR REPLACE FUNCTION search_documents(
-    query_text TEXT,
+CREATE OR REPLACE FUNCTION search_documents_by_embedding(
+    query_embedding vector(768),
     limit_count INTEGER DEFAULT 10
 )
 RETURNS TABLE (
@@ -99,14 +161,9 @@ RETURNS TABLE (
     filename VARCHAR(255),
     title TEXT,
     brief TEXT,
-    similarity FLOAT
+    similarity DOUBLE PRECISION
 ) AS $$
-DECLARE
-    query_embedding vector(768);
 BEGIN
-    -- Generate embedding for query text
-    query_embedding := google_ml.embedding('text-embedding-005',query_text);
-    
     -- Perform cosine similarity search
     RETURN QUERY
     SELECT 
@@ -122,26 +179,44 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
--- Function to perform vector similarity search on instructions
--- Returns instructions ordered by cosine similarity
-CREATE OR REPLACE FUNCTION search_instructions(
+-- Function to perform vector similarity search on documents
+-- Returns documents ordered by cosine similarity
+CREATE OR REPLACE FUNCTION search_documents(
     query_text TEXT,
     limit_count INTEGER DEFAULT 10
 )
+RETURNS TABLE (
+    id UUID,
+    filename VARCHAR(255),
+    title TEXT,
+    brief TEXT,
+    similarity DOUBLE PRECISION
+) AS $$
+BEGIN
+    -- Generate embedding for query text and search with it
+    RETURN QUERY
+    SELECT * FROM search_documents_by_embedding(
+        google_ml.embedding('text-embedding-005',query_text)::vector(768),
+        limit_count
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function to perform vector similarity search on instructions with a precomputed query embedding
+-- Returns instructions ordered by cosine similarity
+CREATE OR REPLACE FUNCTION search_instructions_by_embedding(
+    query_embedding vector(768),
+    limit_count INTEGER DEFAULT 10
+)
 RETURNS TABLE (
     id UUID,
     parent_id UUID,
     page INTEGER,
     header TEXT,
     instruction TEXT,
-    similarity FLOAT
+    similarity DOUBLE PRECISION
 ) AS $$
-DECLARE
-    query_embedding vector(768);
 BEGIN
-    -- Generate embedding for query text
-    query_embedding := google_ml.embedding('text-embedding-005',query_text);
-    
     -- Perform cosine similarity search
     RETURN QUERY
     SELECT 
@@ -158,6 +233,30 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Function to perform vector similarity search on instructions
+-- Returns instructions ordered by cosine similarity
+CREATE OR REPLACE FUNCTION search_instructions(
+    query_text TEXT,
+    limit_count INTEGER DEFAULT 10
+)
+RETURNS TABLE (
+    id UUID,
+    parent_id UUID,
+    page INTEGER,
+    header TEXT,
+    instruction TEXT,
+    similarity DOUBLE PRECISION
+) AS $$
+BEGIN
+    -- Generate embedding for query text and search with it
+    RETURN QUERY
+    SELECT * FROM search_instructions_by_embedding(
+        google_ml.embedding('text-embedding-005',query_text)::vector(768),
+        limit_count
+    );
+END;
+$$ LANGUAGE plpgsql;
+
 -- Function to get all instructions for a document
 CREATE OR REPLACE FUNCTION get_document_instructions(p_doc_id UUID)
 RETURNS TABLE (
@@ -184,7 +283,11 @@ $$ LANGUAGE plpgsql;
 -- Comments for documentation
 COMMENT ON FUNCTION store_document IS 'Stores a document with auto-generated embedding, replacing VectorizedTutorial parent document logic';
 COMMENT ON FUNCTION store_instruction IS 'Stores an instruction with auto-generated embedding, replacing VectorizedTutorial child instruction logic';
+COMMENT ON FUNCTION store_instructions_bulk IS 'Stores all instructions of a document from a JSON array in a single statement';
+COMMENT ON FUNCTION store_document_with_instructions IS 'Atomically stores a document and replaces its instructions in one call';
 COMMENT ON FUNCTION search_documents IS 'Performs semantic search on documents using vector similarity';
 COMMENT ON FUNCTION search_instructions IS 'Performs semantic search on instructions using vector similarity';
+COMMENT ON FUNCTION search_documents_by_embedding IS 'Performs semantic search on documents with a precomputed query embedding';
+COMMENT ON FUNCTION search_instructions_by_embedding IS 'Performs semantic search on instructions with a precomputed query embedding';
 COMMENT ON FUNCTION get_document_instructions IS 'Retrieves all instructions for a given document';
 
@@ -5,6 +5,7 @@
 -- Enable required extensions
 CREATE EXTENSION IF NOT EXISTS vector;
 CREATE EXTENSION IF NOT EXISTS google_ml_integration;
+CREATE EXTENSION IF NOT EXISTS alloydb_scann;  -- ScaNN vector indexes below
 
 -- Documents table (parent records)
 -- Stores the main document metadata and aggregated information
@@ -44,6 +45,21 @@ CREATE TABLE IF NOT EXISTS instructions (
     CONSTRAINT instructions_box_2d_length CHECK (array_length(box_2d, 1) = 4)
 );
 
+-- Processing jobs table
+-- Tracks documents submitted for background processing
+CREATE TABLE IF NOT EXISTS processing_jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    file_id VARCHAR(255),
+    filename VARCHAR(255),
+    -- Job status: pending, processing, completed, failed
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    document_id UUID REFERENCES documents(id) ON DELETE SET NULL,
+    error TEXT,
+    -- Metadata
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Create indexes for efficient querying
 
 -- Text search indexes on documents
@@ -51,6 +67,9 @@ CREATE INDEX IF NOT EXISTS idx_documents_filename ON documents(filename);
 CREATE INDEX IF NOT EXISTS idx_documents_title ON documents USING gin(to_tsvector('english', title));
 CREATE INDEX IF NOT EXISTS idx_documents_brief ON documents USING gin(to_tsvector('english', brief));
 
+-- Keyset pagination index for document listing (newest first, id as tie-breaker)
+CREATE INDEX IF NOT EXISTS idx_documents_created_at_id ON documents(created_at, id);
+
 -- Text search indexes on instructions
 CREATE INDEX IF NOT EXISTS idx_instructions_parent_id ON instructions(parent_id);
 CREATE INDEX IF NOT EXISTS idx_instructions_page ON instructions(page);
@@ -73,6 +92,9 @@ WITH (num_leaves = 100, num_leaves_to_search = 10);
 -- Composite index for parent_id and page (common query pattern)
 CREATE INDEX IF NOT EXISTS idx_instructions_parent_page ON instructions(parent_id, page);
 
+-- Index for job status polling
+CREATE INDEX IF NOT EXISTS idx_processing_jobs_status ON processing_jobs(status);
+
 -- Function to update updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -88,9 +110,16 @@ CREATE TRIGGER update_documents_updated_at
     FOR EACH ROW 
     EXECUTE FUNCTION update_updated_at_column();
 
+-- Trigger to automatically update processing_jobs.updated_at
+CREATE TRIGGER update_processing_jobs_updated_at 
+    BEFORE UPDATE ON processing_jobs 
+    FOR EACH ROW 
+    EXECUTE FUNCTION update_updated_at_column();
+
 -- Comments for documentation
 COMMENT ON TABLE documents IS 'Main document records extracted from PDFs with metadata and embeddings';
 COMMENT ON TABLE instructions IS 'Individual instruction steps with page references and bounding boxes';
+COMMENT ON TABLE processing_jobs IS 'Background document processing jobs and their status';
 COMMENT ON COLUMN documents.embedding IS '768-dimensional vector embedding for semantic search';
 COMMENT ON COLUMN instructions.embedding IS '768-dimensional vector embedding for semantic search';
 COMMENT ON COLUMN instructions.box_2d IS 'Bounding box coordinates [y1, x1, y2, x2] in normalized format (0-1000)';